@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks for the slow parts of the game: level generation, the open
+world, the simulation step, collisions and drawing. Every scenario uses a
+fixed seed, so two runs (or two releases) measure the same work.
+
+Results are written as JSON, to stdout or a file:
+
+python benchmark.py --output results.json
+python benchmark.py --only procgen collision --repeat 10
+"""
+
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import arcade
+import numpy as np
+
+from config import config
+from entities import Monster, Player
+# views imports game, and game imports views back; that only works views first.
+import views
+from game import Game
+from procgen import RLDungeonGenerator, World
+from simulation import Simulation, random_bot
+
+
+def measure(func, repeat: int, setup=None, warmup: int = 1) -> dict:
+    """
+    Time func() `repeat` times, after `warmup` untimed calls. setup(), if
+    given, runs before every call and isn't timed; its result is passed to func.
+    """
+    times = []
+    for run in range(warmup + repeat):
+        setup_args = (setup(),) if setup is not None else ()
+        start = time.perf_counter()
+        func(*setup_args)
+        if run >= warmup:
+            times.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "mean": statistics.fmean(times),
+        "median": statistics.median(times),
+        "min": min(times),
+        "max": max(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+
+
+def result(name: str, params: dict, timings: dict) -> dict:
+    return {"benchmark": name, "params": params, "unit": "s", **timings}
+
+
+def level_config(size: int):
+    """ A copy of the game config for a size x size dungeon """
+    level_config = copy.copy(config)
+    level_config.GRID_WIDTH = level_config.GRID_HEIGHT = size
+    level_config.AREA_WIDTH = level_config.AREA_HEIGHT = size * level_config.TILE_SIZE
+    return level_config
+
+
+def make_level(size: int, seed: int):
+    dg = RLDungeonGenerator(level_config(size), seed)
+    dg.generate_map()
+    return dg.level_data()
+
+
+def scatter(sprites, size: int, rng: random.Random):
+    """ Put sprites at random spots in a size x size pixel square """
+    for sprite in sprites:
+        sprite.center_x = rng.uniform(0, size)
+        sprite.center_y = rng.uniform(0, size)
+
+
+def bench_procgen(args) -> list:
+    results = []
+    for size in args.sizes:
+        level_config_ = level_config(size)
+
+        def new_generator():
+            return RLDungeonGenerator(level_config_, args.seed)
+
+        results.append(result("procgen.generate_map", {"size": size, "seed": args.seed},
+                              measure(lambda dg: dg.generate_map(), args.repeat, new_generator)))
+
+        dg = new_generator()
+        dg.generate_map()
+        results.append(result("procgen.build_map", {"size": size, "seed": args.seed},
+                              measure(dg.build_map, args.repeat)))
+    return results
+
+
+def bench_world(args) -> list:
+    def new_world():
+        return World(args.seed)
+
+    return [
+        result("world.place_random_trees", {"seed": args.seed},
+               measure(lambda world: world.place_random_trees(), args.repeat, new_world)),
+        result("world.generate_forest", {"seed": args.seed, "radius": 4},
+               measure(lambda world: world.generate_forest((0, 0)), args.repeat, new_world)),
+        result("world.generate_chunk", {"seed": args.seed, "size": config.CHUNK_SIZE},
+               measure(lambda: new_world().generate_chunk(0, 0, config.CHUNK_SIZE), args.repeat)),
+    ]
+
+
+def bench_update(args) -> list:
+    """ Simulation.step (the whole of Game.on_update bar the viewport) """
+    level = make_level(args.level_size, args.seed)
+    results = []
+    for enemy_count in args.enemies:
+        sim = Simulation()
+        sim.setup(level, enemy_count=enemy_count)
+        bot_rng = random.Random(args.seed)
+        steps = iter(range(sys.maxsize))
+
+        def step():
+            if next(steps) % 30 == 0:
+                random_bot(sim, bot_rng)
+            sim.step(1 / 60)
+
+        results.append(result("simulation.step", {"enemies": enemy_count, "level_size": args.level_size,
+                                                  "seed": args.seed},
+                              measure(step, args.steps, warmup=10)))
+    return results
+
+
+def bench_collision(args) -> list:
+    """ The player against N monsters scattered over a square the size of the window """
+    rng = random.Random(args.seed)
+    player = Player()
+    results = []
+    for enemy_count in args.enemies:
+        for spatial_hash in (False, True):
+            enemy_list = arcade.SpriteList(use_spatial_hash=spatial_hash)
+            monsters = [Monster() for _ in range(enemy_count)]
+            scatter(monsters, config.WINDOW_WIDTH, rng)
+            enemy_list.extend(monsters)
+            scatter([player], config.WINDOW_WIDTH, rng)
+            results.append(result("collision.check_for_collision_with_list",
+                                  {"enemies": enemy_count, "spatial_hash": spatial_hash, "seed": args.seed},
+                                  measure(lambda: arcade.check_for_collision_with_list(player, enemy_list),
+                                          args.repeat * 10)))
+    return results
+
+
+def bench_draw(args) -> list:
+    """ Game.on_draw into an invisible window, waiting for the GPU to finish """
+    try:
+        window = arcade.Window(config.WINDOW_WIDTH, config.WINDOW_HEIGHT, config.WINDOW_TITLE, visible=False)
+    except Exception as error:      # No display or no GL here; report it rather than fail.
+        return [{"benchmark": "game.on_draw", "skipped": f"no GL context: {error}"}]
+
+    level = make_level(args.level_size, args.seed)
+    results = []
+    try:
+        for enemy_count in args.enemies:
+            game = Game()
+            window.show_view(game)
+            game.sim.setup(level, enemy_count=enemy_count)
+
+            def draw():
+                game.on_draw()
+                window.ctx.finish()
+
+            results.append(result("game.on_draw", {"enemies": enemy_count, "level_size": args.level_size,
+                                                   "seed": args.seed},
+                                  measure(draw, args.steps, warmup=10)))
+    finally:
+        window.close()
+    return results
+
+
+BENCHMARKS = {
+    "procgen": bench_procgen,
+    "world": bench_world,
+    "update": bench_update,
+    "collision": bench_collision,
+    "draw": bench_draw,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the game's benchmarks and write the results as JSON.")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS),
+                        help="benchmarks to run (default: all)")
+    parser.add_argument("--seed", type=int, default=1, help="seed for every scenario")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs of each benchmark")
+    parser.add_argument("--steps", type=int, default=300, help="timed frames for the update and draw benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 128, 256], help="dungeon sizes to generate")
+    parser.add_argument("--enemies", type=int, nargs="+", default=[1, 50, 200], help="monster counts")
+    parser.add_argument("--level-size", type=int, default=64, help="dungeon size for the update and draw benchmarks")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    # Assets are loaded relative to this file, same as in the game.
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    results = []
+    for name in args.only:
+        print(f"Running {name}...", file=sys.stderr)
+        results.extend(BENCHMARKS[name](args))
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "arcade": arcade.version.VERSION,
+            "numpy": np.__version__,
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
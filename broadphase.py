@@ -0,0 +1,173 @@
+from typing import List, Tuple
+
+import arcade
+import numpy as np
+
+from config import config
+
+# Cells are keyed by column * CELL_STRIDE + row, with rows shifted to be
+# positive, so keys sort by column then row.
+CELL_STRIDE = 1 << 32
+ROW_OFFSET = 1 << 31
+
+
+def hit_box_extents(sprite) -> Tuple[float, float, float, float]:
+    """ (left, bottom, right, top) of a sprite's hit box, relative to its centre, scaled """
+    xs, ys = zip(*sprite.hit_box)
+    scale = sprite.scale
+    return min(xs) * scale, min(ys) * scale, max(xs) * scale, max(ys) * scale
+
+
+def push_apart(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    For (n, 4) boxes a overlapping boxes b, the (n, 2) shortest move that
+    takes each a out of its b: along whichever axis they overlap least,
+    away from b's centre (left or down if they share one).
+    """
+    overlap = np.minimum(a[:, 2:], b[:, 2:]) - np.maximum(a[:, :2], b[:, :2])
+    away = np.where((a[:, :2] + a[:, 2:]) > (b[:, :2] + b[:, 2:]), 1.0, -1.0)
+    push = np.zeros((len(a), 2))
+    rows = np.arange(len(a))
+    axis = overlap.argmin(axis=1)
+    push[rows, axis] = np.maximum(overlap[rows, axis], 0) * away[rows, axis]
+    return push
+
+
+class UniformGrid:
+    """
+    A uniform grid over entity bounding boxes, one tile per cell, for
+    finding what might be colliding without testing everything against
+    everything.
+
+    Every entity is listed under each cell its box overlaps, as one array
+    of (cell key, entity) entries sorted by key. Queries look up the few
+    cells they cover with a binary search, so they cost what's nearby, not
+    how many entities there are. move() only re-sorts when an entity has
+    crossed into other cells.
+    """
+    def __init__(self, cell_size: float = config.TILE_SIZE):
+        self.cell_size = cell_size
+        self.sprites: List[arcade.Sprite] = []
+        # Hit box extents relative to each centre, and current boxes, (n, 4).
+        self.extents = np.zeros((0, 4))
+        self.boxes = np.zeros((0, 4))
+        self.cells = np.zeros((0, 4), dtype=np.int64)
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.version = None
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def build(self, sprites, x=None, y=None, version=None):
+        """ Index sprites, at x, y if given (e.g. from an EntityStore) or where they are """
+        self.sprites = list(sprites)
+        self.version = version
+        self.extents = np.array([hit_box_extents(sprite) for sprite in self.sprites], dtype=np.float64).reshape(-1, 4)
+        self.cells = np.zeros((0, 4), dtype=np.int64)
+        if x is None:
+            x = np.array([sprite.center_x for sprite in self.sprites], dtype=np.float64)
+            y = np.array([sprite.center_y for sprite in self.sprites], dtype=np.float64)
+        self.move(x, y)
+
+    def update_from_store(self, store):
+        """ Follow an EntityStore's entities, rebuilding only if its members have changed """
+        if store.version != self.version:
+            self.build(store.entities, store.x, store.y, store.version)
+        else:
+            self.move(store.x, store.y)
+
+    def move(self, x: np.ndarray, y: np.ndarray):
+        """ New centres for every entity, in the order they were built with """
+        boxes = self.extents + np.stack([x, y, x, y], axis=1)
+        self.boxes = boxes
+        cells = np.floor(boxes / self.cell_size).astype(np.int64)
+        if cells.shape == self.cells.shape and np.array_equal(cells, self.cells):
+            # Nobody changed cells; the index is still right.
+            return
+        self.cells = cells
+
+        # One entry for every cell of every entity's box.
+        first_col, first_row, last_col, last_row = cells.T
+        widths = last_col - first_col + 1
+        counts = widths * (last_row - first_row + 1)
+        ids = np.repeat(np.arange(len(cells)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cols = first_col[ids] + offsets % widths[ids]
+        rows = first_row[ids] + offsets // widths[ids]
+        keys = cols * CELL_STRIDE + rows + ROW_OFFSET
+
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.ids = ids[order]
+
+    def candidates(self, left: float, bottom: float, right: float, top: float) -> np.ndarray:
+        """ Entities listed in any cell the box overlaps (may include near misses) """
+        size = self.cell_size
+        cols = np.arange(int(left // size), int(right // size) + 1)
+        # Within a column, the box's cells are one run of keys.
+        starts = np.searchsorted(self.keys, cols * CELL_STRIDE + int(bottom // size) + ROW_OFFSET, side="left")
+        ends = np.searchsorted(self.keys, cols * CELL_STRIDE + int(top // size) + ROW_OFFSET, side="right")
+        counts = ends - starts
+        if counts.sum() == 0:
+            return np.zeros(0, dtype=np.int64)
+        entries = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return np.unique(self.ids[entries])
+
+    def query_box(self, left: float, bottom: float, right: float, top: float) -> np.ndarray:
+        """ Entities whose boxes overlap the box """
+        ids = self.candidates(left, bottom, right, top)
+        boxes = self.boxes[ids]
+        hit = (boxes[:, 0] <= right) & (boxes[:, 2] >= left) & (boxes[:, 1] <= top) & (boxes[:, 3] >= bottom)
+        return ids[hit]
+
+    def query_point(self, x: float, y: float) -> np.ndarray:
+        """ Entities whose boxes contain the point, e.g. for projectiles """
+        return self.query_box(x, y, x, y)
+
+    def collisions(self, sprite: arcade.Sprite) -> List[arcade.Sprite]:
+        """
+        What the sprite's hit box touches, like check_for_collision_with_list:
+        boxes from the grid, then arcade's polygon test on what's left.
+        """
+        left, bottom, right, top = hit_box_extents(sprite)
+        x, y = sprite.position
+        ids = self.query_box(x + left, y + bottom, x + right, y + top)
+        return [self.sprites[i] for i in ids.tolist()
+                if self.sprites[i] is not sprite and arcade.check_for_collision(sprite, self.sprites[i])]
+
+    def pairs(self) -> np.ndarray:
+        """ (i, j) index pairs, i < j, of entities whose boxes overlap each other """
+        if len(self.keys) < 2:
+            return np.zeros((0, 2), dtype=np.int64)
+        # Pair every entry with the entries after it in the same cell.
+        starts = np.flatnonzero(np.r_[True, self.keys[1:] != self.keys[:-1]])
+        counts = np.diff(np.r_[starts, len(self.keys)])
+        group_ends = np.repeat(starts + counts, counts)
+        partners = group_ends - np.arange(len(self.keys)) - 1
+        if partners.sum() == 0:
+            return np.zeros((0, 2), dtype=np.int64)
+        first = np.repeat(np.arange(len(self.keys)), partners)
+        second = first + 1 + np.arange(partners.sum()) - np.repeat(np.cumsum(partners) - partners, partners)
+        a, b = self.ids[first], self.ids[second]
+        # Entities sharing several cells are found more than once.
+        codes = np.unique(np.minimum(a, b) * len(self.sprites) + np.maximum(a, b))
+        pairs = np.stack([codes // len(self.sprites), codes % len(self.sprites)], axis=1)
+
+        a, b = self.boxes[pairs[:, 0]], self.boxes[pairs[:, 1]]
+        hit = (a[:, 0] <= b[:, 2]) & (a[:, 2] >= b[:, 0]) & (a[:, 1] <= b[:, 3]) & (a[:, 3] >= b[:, 1])
+        return pairs[hit]
+
+    def separation(self, limit: float) -> np.ndarray:
+        """
+        (n, 2) move for every entity to stop overlapping the others: half
+        the overlap for each pair (they each move), summed over its pairs
+        and at most `limit` along each axis.
+        """
+        push = np.zeros((len(self.sprites), 2))
+        pairs = self.pairs()
+        if len(pairs):
+            apart = push_apart(self.boxes[pairs[:, 0]], self.boxes[pairs[:, 1]]) / 2
+            np.add.at(push, pairs[:, 0], apart)
+            np.add.at(push, pairs[:, 1], -apart)
+        return np.clip(push, -limit, limit)
@@ -16,6 +16,49 @@ class Config:
         self.AREA_WIDTH = self.GRID_WIDTH * self.TILE_SIZE
         self.AREA_HEIGHT = self.GRID_HEIGHT * self.TILE_SIZE
 
+        # How dungeon rooms get joined up: "mst" (minimum spanning tree) or
+        # "closest" (the original merge-closest-groups search, much slower).
+        self.DUNGEON_CONNECT_STRATEGY = "mst"
+        # Extra corridors to add on top of the spanning tree, as a fraction of
+        # the tree's corridors, so the dungeon has some loops.
+        self.DUNGEON_EXTRA_LOOPS = 0.0
+        # Maps are split into subtrees no bigger than this (in tiles) before
+        # the rooms are partitioned. Subtrees can be split in parallel by
+        # BSP_WORKERS processes; 1 splits them all in this process.
+        self.BSP_SUBTREE_SIZE = 256
+        self.BSP_WORKERS = 1
+
+        # Seed for everything the game generates. None picks a new one each run.
+        self.SEED = None
+        # Generated levels are cached here, so a known seed loads straight away.
+        # Only used while SEED is set: random seeds never come round again.
+        # Past MAP_CACHE_MAX_FILES levels the least recently used are deleted.
+        self.USE_MAP_CACHE = True
+        self.MAP_CACHE_DIR = "cache/maps"
+        self.MAP_CACHE_MAX_FILES = 64
+
+        # Hit boxes worked out ahead of time for every sprite image (see hitbox_cache.py).
+        self.HIT_BOX_CACHE = "assets/gfx/hitboxes.json"
+
+        # True to play in one endless open world instead of dungeon levels.
+        self.OPEN_WORLD = False
+
+        # The world is streamed in square chunks of CHUNK_SIZE x CHUNK_SIZE tiles.
+        # Chunks within CHUNK_LOAD_MARGIN chunks of the screen are kept loaded,
+        # and the least recently used ones are dropped above MAX_LOADED_CHUNKS.
+        self.CHUNK_SIZE = 16
+        self.CHUNK_LOAD_MARGIN = 1
+        self.MAX_LOADED_CHUNKS = 64
+
+        # How many tiles the player can see, for field of view (see fov.py).
+        self.FOV_RADIUS = 12
+
+        # Monsters chase the player down a flow field (see flowfield.py) over a
+        # square of FLOW_FIELD_RADIUS tiles around the player, at MONSTER_SPEED
+        # pixels per update.
+        self.FLOW_FIELD_RADIUS = 32
+        self.MONSTER_SPEED = 1.5
+
         # How fast the player moves
         self.MOVEMENT_SPEED = 5
 
@@ -30,8 +73,15 @@ class Config:
         self.WINDOW_TITLE = "Another Roguelike Dungeon Crawler!"
 
         self.BACKGROUND_COLOR = (0x20, 0x20, 0x20)
+        # Only entities within this many pixels of the screen are drawn. Covers
+        # sprites and health bars drawn past their hit boxes.
+        self.CULL_MARGIN = 96
         # Show or hide performance stats.
         self.SHOW_PERFORMANCE = False
+        # Where to send per-frame metrics (see telemetry.py), e.g.
+        # "telemetry/frames.jsonl", "telemetry/frames.csv" or
+        # "udp://127.0.0.1:9999". None turns telemetry off.
+        self.TELEMETRY_TARGET = None
 
         # Player hitbox coords during different actions
         self.player_hit_box_coords = [
@@ -0,0 +1,43 @@
+from typing import List
+
+import arcade
+
+from config import config
+
+
+class ViewCuller:
+    """
+    The entities on screen, found through the simulation's UniformGrid, so
+    only they get drawn.
+
+    `sprite_list` holds just the sprites inside the view (plus a margin for
+    what's drawn outside their hit boxes). Each frame only the sprites that
+    came into or went out of view are added or removed, so the work follows
+    the screen, not how many entities the world has.
+    """
+    def __init__(self, margin: float = config.CULL_MARGIN):
+        self.margin = margin
+        self.sprite_list = arcade.SpriteList(use_spatial_hash=False)
+        self.shown = set()
+
+    def __len__(self):
+        return len(self.sprite_list)
+
+    def update(self, grid, view_left: float, view_bottom: float,
+               width: float = config.WINDOW_WIDTH, height: float = config.WINDOW_HEIGHT):
+        margin = self.margin
+        ids = grid.query_box(view_left - margin, view_bottom - margin,
+                             view_left + width + margin, view_bottom + height + margin)
+        shown = {grid.sprites[i] for i in ids.tolist()}
+        for sprite in self.shown - shown:
+            # Sprites killed off may have taken themselves out already.
+            if self.sprite_list in sprite.sprite_lists:
+                self.sprite_list.remove(sprite)
+        for sprite in shown - self.shown:
+            self.sprite_list.append(sprite)
+        self.shown = shown
+
+    def health_bar_slots(self, *others) -> List[int]:
+        """ Health bar slots of the sprites on screen, and of any others given (e.g. the player) """
+        return [sprite.health_bar_slot for sprite in (*self.sprite_list, *others)
+                if sprite.health_bar_slot is not None]
@@ -1,16 +1,33 @@
 from __future__ import annotations
 import random
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, NamedTuple
 
 import arcade
 
 from config import config
+from entity_store import StoreField
+from hitbox_cache import hit_box_cache
+from textures import textures
 
 if TYPE_CHECKING:
     from arcade import Texture
 
 
 class BaseEntity(arcade.Sprite):
+    # The HealthBarLayer drawing this entity's health bar, if any, and the
+    # entity's slot in it.
+    health_bar = None
+    health_bar_slot = None
+    # The EntityStore holding this entity's state, if any, and its index
+    # there. These attributes live in the store's arrays while it's in one.
+    store = None
+    store_index = None
+    change_x = StoreField("vx")
+    change_y = StoreField("vy")
+    _hp = StoreField("hp")
+    _max_hp = StoreField("max_hp")
+    invincible_frame_counter = StoreField("invincible")
+
     def __init__(
         self, 
         filename: str = None, 
@@ -33,6 +50,11 @@ class BaseEntity(arcade.Sprite):
         max_hp=100, 
         hp:int=100, 
     ):
+        if filename is not None:
+            # Fill in the texture's hit box from the cache before arcade scans
+            # the image for one. Sprite gets the same texture from arcade's
+            # texture cache.
+            hit_box_cache.load_texture(filename, hit_box_algorithm, hit_box_detail)
         super().__init__(
             filename=filename, 
             scale=scale, 
@@ -72,6 +94,31 @@ class BaseEntity(arcade.Sprite):
     def hp(self, value):
         # Keep the HP within the allowed range (0 to max)
         self._hp = max(0, min(value, self.max_hp))
+        if self.health_bar is not None:
+            self.health_bar.update(self)
+
+    # Moving the entity moves its health bar (and its place in the store) too.
+    def _set_position(self, new_value):
+        super()._set_position(new_value)
+        self.moved()
+
+    def _set_center_x(self, new_value: float):
+        super()._set_center_x(new_value)
+        self.moved()
+
+    def _set_center_y(self, new_value: float):
+        super()._set_center_y(new_value)
+        self.moved()
+
+    def moved(self):
+        if self.store is not None:
+            self.store.moved(self)
+        if self.health_bar is not None:
+            self.health_bar.update(self)
+
+    position = property(arcade.Sprite._get_position, _set_position)
+    center_x = property(arcade.Sprite._get_center_x, _set_center_x)
+    center_y = property(arcade.Sprite._get_center_y, _set_center_y)
     
     def on_draw(self):
         # draw the current hp above player
@@ -107,33 +154,61 @@ class BaseEntity(arcade.Sprite):
                 self.invincible_frame_counter = 0
 
 
+class HitBox(NamedTuple):
+    """ One animation frame's hit box """
+    # Relative to the sprite's centre at a scale of 1, for set_hit_box.
+    points: tuple
+    # The same, times the sprite's scale, and the bounding box of those.
+    scaled: tuple
+    left: float
+    bottom: float
+    right: float
+    top: float
+
+
+# Hit box tables by (animation set name, scale).
+_hit_box_tables = {}
+
+
+def player_hit_boxes(animation, scale: float) -> list:
+    """
+    config.player_hit_box_coords as a flat table, indexed by the animation's
+    frame handles, made once per scale.
+    """
+    table = _hit_box_tables.get((animation.name, scale))
+    if table is None:
+        table = [None] * len(animation.textures)
+        for action, directions in enumerate(config.player_hit_box_coords):
+            for direction, frames in enumerate(directions):
+                for frame, points in enumerate(frames):
+                    scaled = tuple((x * scale, y * scale) for x, y in points)
+                    xs, ys = zip(*scaled)
+                    table[animation.handle(action, direction, frame)] = HitBox(
+                        tuple(points), scaled, min(xs), min(ys), max(xs), max(ys))
+        _hit_box_tables[(animation.name, scale)] = table
+    return table
+
+
 class Player(BaseEntity):
     def __init__(self):
         super().__init__(
             center_x = random.randrange(config.GRID_WIDTH) * config.TILE_SIZE, 
             center_y = random.randrange(config.GRID_HEIGHT) * config.TILE_SIZE, 
         )
-        # Animation state tracking
-        self.charactor_directions = ["down", "up", "right", "left"]
+        # Animation state tracking. The frames are shared by every player.
+        self.animation = textures.animation("player")
+        self.charactor_directions = self.animation.directions
         self.direction_index = 0
-        self.charactor_actions = ["idle", "walk", "attack"]
+        self.charactor_actions = self.animation.actions
         self.action_index = 0
-        self.max_frames = 4
+        self.max_frames = self.animation.frame_count
         self.cur_frame = 0
         self.updates_per_frame = 5
-
-        # Load textures
-        self.walk_textures = []
-        for action in self.charactor_actions:
-            action_frames = []
-            for direction in self.charactor_directions:
-                animation_frames = []
-                for i in range(self.max_frames):
-                    texture = arcade.load_texture(f"assets/gfx/player/{action}_{direction}_{i}.png")
-                    animation_frames.append(texture)
-                action_frames.append(animation_frames)
-            self.walk_textures.append(action_frames)
-        self.texture = self.walk_textures[self.action_index][self.direction_index][self.cur_frame]
+        self.texture = self.animation.frame(self.action_index, self.direction_index, self.cur_frame)
+        # Hit box of each frame, and the handle of the one in use.
+        self.hit_boxes = player_hit_boxes(self.animation, self.scale)
+        self.hit_box_handle = None
+        self.update_hit_box(self.cur_frame)
         
         # Track movement keys
         self.down_pressed = False
@@ -165,10 +240,10 @@ class Player(BaseEntity):
                 self.attack_pressed = False
             # Set the current animation frame for the attack.
             frame = self.cur_frame // self.updates_per_frame
-            self.texture = self.walk_textures[self.action_index][self.direction_index][frame]
+            self.texture = self.animation.frame(self.action_index, self.direction_index, frame)
             self.cur_frame += 1
             # Update the hitbox to align with the attack animation.
-            self.set_hit_box(config.player_hit_box_coords[self.action_index][self.direction_index][frame])
+            self.update_hit_box(frame)
             return
 
         # Idle animation
@@ -176,7 +251,7 @@ class Player(BaseEntity):
             self.action_index = 0
             frame = self.cur_frame // self.updates_per_frame
             # Change the hitbox to match the idle animation frame.
-            self.set_hit_box(config.player_hit_box_coords[self.action_index][self.direction_index][frame])
+            self.update_hit_box(frame)
             return
 
         # Walking animation
@@ -185,9 +260,26 @@ class Player(BaseEntity):
             # Cycle animation around to first frame.
             self.cur_frame = 0
         frame = self.cur_frame // self.updates_per_frame
-        self.texture = self.walk_textures[self.action_index][self.direction_index][frame]
+        self.texture = self.animation.frame(self.action_index, self.direction_index, frame)
         # Change the hitbox to match the current walking animation frame.
-        self.set_hit_box(config.player_hit_box_coords[self.action_index][self.direction_index][frame])
+        self.update_hit_box(frame)
+
+    def update_hit_box(self, frame: int):
+        """
+        Use the hit box for the current action, direction and frame. Only
+        touches the sprite when the frame has changed, so arcade's cached
+        hit box stays valid in between.
+        """
+        handle = self.animation.handle(self.action_index, self.direction_index, frame)
+        if handle != self.hit_box_handle:
+            self.hit_box_handle = handle
+            self.set_hit_box(self.hit_boxes[handle].points)
+
+    def hit_box_bounds(self) -> tuple:
+        """ (left, bottom, right, top) of the current hit box, in world coordinates """
+        hit_box = self.hit_boxes[self.hit_box_handle]
+        return (self.center_x + hit_box.left, self.center_y + hit_box.bottom,
+                self.center_x + hit_box.right, self.center_y + hit_box.top)
         
     def on_update(self, delta_time):
         """ Movement and game logic """
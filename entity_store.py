@@ -0,0 +1,197 @@
+import arcade
+import numpy as np
+
+from broadphase import hit_box_extents
+
+
+class StoreField:
+    """
+    An entity attribute that lives in the entity's EntityStore column while
+    the entity is in a store, and on the entity itself otherwise. Entity
+    code reads and writes it the same either way.
+    """
+    def __init__(self, column: str, default=0):
+        self.column = column
+        self.default = default
+
+    def __set_name__(self, owner, name):
+        self.local = f"_{name}_value"
+
+    def __get__(self, entity, owner=None):
+        if entity is None:
+            return self
+        store = entity.store
+        if store is None:
+            return entity.__dict__.get(self.local, self.default)
+        return store.columns[self.column][entity.store_index]
+
+    def __set__(self, entity, value):
+        store = entity.store
+        if store is None:
+            entity.__dict__[self.local] = value
+        else:
+            store.columns[self.column][entity.store_index] = value
+
+
+class EntityStore:
+    """
+    Position, velocity, hp and timers of a group of entities, one numpy
+    array per field (struct of arrays), so a frame's update is one
+    vectorised pass however many entities there are.
+
+    The sprites stay as they are for drawing and collisions, but only as a
+    view: update() copies positions out to the sprites that moved. Entity
+    attributes declared as StoreFields (see BaseEntity) read and write the
+    arrays directly.
+    """
+    FIELDS = {
+        "x": np.float64,
+        "y": np.float64,
+        "vx": np.float64,
+        "vy": np.float64,
+        "hp": np.float64,
+        "max_hp": np.float64,
+        "invincible": np.float64,
+        # Slow down by this much every update, like Player does.
+        "friction": np.float64,
+        "max_speed": np.float64,
+        # Hit box extents around the centre, for moving through the map.
+        "box_left": np.float64,
+        "box_bottom": np.float64,
+        "box_right": np.float64,
+        "box_top": np.float64,
+    }
+
+    def __init__(self, capacity: int = 64):
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in self.FIELDS.items()}
+        self.entities = []
+        # Bumped whenever entities are added or removed, so indexes built
+        # over the store (see broadphase) know to rebuild.
+        self.version = 0
+        # (store version, layer, layer version), and the entities' places in
+        # the layer, see health_bar_slots().
+        self.bar_key = None
+        self.bar_indexes = None
+        self.bar_slots = None
+        self.bar_others = None
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __iter__(self):
+        return iter(self.entities)
+
+    def __getattr__(self, name):
+        # store.hp etc. for the columns, trimmed to the entities in use.
+        columns = self.__dict__.get("columns")
+        if columns is None or name not in columns:
+            raise AttributeError(name)
+        return columns[name][:len(self.entities)]
+
+    def add(self, entity, friction: float = 0.0, max_speed: float = np.inf):
+        """ Move an entity's state into the store """
+        if len(self.entities) == len(self.columns["x"]):
+            for name, column in self.columns.items():
+                self.columns[name] = np.resize(column, max(1, len(column) * 2))
+        # Read everything before the entity switches over to the store.
+        x, y = entity.position
+        state = (x, y, entity.change_x, entity.change_y, entity.hp, entity.max_hp,
+                 entity.invincible_frame_counter, friction, max_speed, *hit_box_extents(entity))
+
+        index = len(self.entities)
+        self.entities.append(entity)
+        for column, value in zip(self.columns.values(), state):
+            column[index] = value
+        entity.store_index = index
+        entity.store = self
+        self.version += 1
+
+    def extend(self, entities):
+        for entity in entities:
+            self.add(entity)
+
+    def remove(self, entity):
+        """ Move an entity's state back onto it and drop it, filling the gap with the last entity """
+        state = (entity.change_x, entity.change_y, entity.hp, entity.max_hp, entity.invincible_frame_counter)
+        index = entity.store_index
+        last = len(self.entities) - 1
+        if index != last:
+            moved = self.entities[last]
+            for column in self.columns.values():
+                column[index] = column[last]
+            self.entities[index] = moved
+            moved.store_index = index
+        self.entities.pop()
+        self.version += 1
+        entity.store = None
+        entity.store_index = None
+        entity.change_x, entity.change_y, entity.hp, entity.max_hp, entity.invincible_frame_counter = state
+
+    def moved(self, entity):
+        """ Called when an entity's sprite is moved from outside the store """
+        x, y = entity.position
+        self.columns["x"][entity.store_index] = x
+        self.columns["y"][entity.store_index] = y
+
+    def update(self, delta_time: float, physics=None):
+        """
+        One frame for every entity: timers, friction, speed limit, hp,
+        movement. With a TilePhysics, entities stop at walls.
+        """
+        count = len(self.entities)
+        if count == 0:
+            return
+        x, y, vx, vy, hp, max_hp, invincible, friction, max_speed, left, bottom, right, top = (
+            column[:count] for column in self.columns.values())
+
+        # Count down invincibility, stopping at 0.
+        invincible -= delta_time
+        np.maximum(invincible, 0, out=invincible)
+
+        # Friction, towards 0 without overshooting it.
+        for velocity in (vx, vy):
+            np.copysign(np.maximum(np.abs(velocity) - friction, 0), velocity, out=velocity)
+            np.clip(velocity, -max_speed, max_speed, out=velocity)
+
+        np.clip(hp, 0, max_hp, out=hp)
+
+        if physics is None:
+            moved_x, moved_y = vx, vy
+        else:
+            boxes = np.stack([x + left, y + bottom, x + right, y + top], axis=1)
+            moved_x, moved_y, stopped_x, stopped_y = physics.move(boxes, vx, vy)
+            vx[stopped_x] = 0
+            vy[stopped_y] = 0
+        x += moved_x
+        y += moved_y
+        # Only the sprites that moved need their positions updated. This is
+        # arcade's setter, not the entity's, which would call moved() to copy
+        # the same values back into the store and write each health bar.
+        moved = (moved_x != 0) | (moved_y != 0)
+        for index in np.flatnonzero(moved).tolist():
+            arcade.Sprite._set_position(self.entities[index], (x[index], y[index]))
+        layer, indexes, slots, others = self.health_bar_slots()
+        if layer is not None:
+            here = moved[indexes]
+            layer.update_many(slots[here], x[indexes[here]], y[indexes[here]])
+        for index in others:
+            if moved[index]:
+                self.entities[index].health_bar.update(self.entities[index])
+
+    def health_bar_slots(self):
+        """
+        The HealthBarLayer of the store's entities, the index in the store
+        and slot in the layer of each entity with a bar in it (as arrays),
+        and the indexes of any entities with bars in some other layer.
+        Looked up again only when the store or the layer changes.
+        """
+        layer = next((entity.health_bar for entity in self.entities if entity.health_bar is not None), None)
+        key = (self.version, layer, None if layer is None else layer.version)
+        if key != self.bar_key:
+            self.bar_key = key
+            indexes = [index for index, entity in enumerate(self.entities) if entity.health_bar is layer]
+            self.bar_indexes = np.array(indexes, dtype=np.int64)
+            self.bar_slots = np.array([self.entities[index].health_bar_slot for index in indexes], dtype=np.int64)
+            self.bar_others = [index for index, entity in enumerate(self.entities)
+                               if entity.health_bar is not None and entity.health_bar is not layer]
+        return layer, self.bar_indexes, self.bar_slots, self.bar_others
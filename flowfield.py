@@ -0,0 +1,135 @@
+from typing import Tuple
+
+import numpy as np
+
+from config import config
+import tile_types
+
+# Row, column offsets to the 8 neighbours of a tile; the first 4 are the
+# straight ones the distances are worked out over.
+NEIGHBOURS = np.array([(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)])
+UNREACHED = np.iinfo(np.int32).max
+
+
+def shifted(grid: np.ndarray, d_row: int, d_col: int, fill) -> np.ndarray:
+    """ grid[row + d_row, col + d_col] for every tile, `fill` off the edge """
+    out = np.full_like(grid, fill)
+    rows, cols = grid.shape
+    out[max(-d_row, 0):rows - max(d_row, 0), max(-d_col, 0):cols - max(d_col, 0)] = \
+        grid[max(d_row, 0):rows - max(-d_row, 0), max(d_col, 0):cols - max(-d_col, 0)]
+    return out
+
+
+class FlowField:
+    """
+    Which way to walk from any tile to reach the player, shared by every
+    monster.
+
+    Distances from the player's tile are worked out once, breadth first
+    over the walkable tiles of a square window around the player, growing
+    the whole wave front with a few array operations per step. Each tile
+    then gets the direction to its closest neighbour. Monsters just look
+    up the tile they're on, all at once, so chasing costs the same for one
+    monster or a horde.
+
+    Nothing is redone while the player stays on the same tile. The window's
+    tiles are only fetched again when the player nears its edge or the
+    map's walkable tiles change.
+    """
+    def __init__(self, game_map, radius: int = config.FLOW_FIELD_RADIUS):
+        self.game_map = game_map
+        self.radius = radius
+        self.side = 2 * radius + 1
+        # World row and column of the window's [0, 0], and its walkable tiles.
+        self.first_row = None
+        self.first_col = None
+        self.walkable = None
+        self.version = None
+        self.source = None
+        # Tiles from the player, UNREACHED if there's no way there.
+        self.distances = None
+        # Unit direction (x, y) to walk from each tile, (side, side, 2).
+        self.flow = None
+
+    def update(self, x: float, y: float) -> bool:
+        """ Follow the player to (x, y). Returns True if the field was redone. """
+        size = self.game_map.tile_size
+        row, col = int(y // size), int(x // size)
+        margin = self.radius // 2
+        if (self.walkable is None or self.version != self.game_map.walkable_version
+                or not margin <= row - self.first_row < self.side - margin
+                or not margin <= col - self.first_col < self.side - margin):
+            # Re-centre the window on the player.
+            self.first_row, self.first_col = row - self.radius, col - self.radius
+            self.version = self.game_map.walkable_version
+            tiles = self.game_map.region(self.first_row, self.first_col, self.side, self.side)
+            self.walkable = tile_types.tiles["walkable"][tiles]
+            self.source = None
+        if (row, col) == self.source:
+            return False
+        self.source = (row, col)
+        self.distances = self.spread(row - self.first_row, col - self.first_col)
+        self.flow = self.downhill()
+        return True
+
+    def spread(self, row: int, col: int) -> np.ndarray:
+        """ Breadth first distances from a tile of the window """
+        distances = np.full(self.walkable.shape, UNREACHED, dtype=np.int32)
+        front = np.zeros(self.walkable.shape, dtype=bool)
+        front[row, col] = True
+        reached = front.copy()
+        distances[row, col] = 0
+        step = 0
+        while front.any():
+            step += 1
+            grown = np.zeros_like(front)
+            grown[1:] |= front[:-1]
+            grown[:-1] |= front[1:]
+            grown[:, 1:] |= front[:, :-1]
+            grown[:, :-1] |= front[:, 1:]
+            front = grown & self.walkable & ~reached
+            reached |= front
+            distances[front] = step
+        return distances
+
+    def downhill(self) -> np.ndarray:
+        """ Direction from each tile to its neighbour closest to the player """
+        costs = np.stack([shifted(self.distances, d_row, d_col, UNREACHED) for d_row, d_col in NEIGHBOURS])
+        # Don't cut corners: a diagonal needs both straight tiles beside it open.
+        for i, (d_row, d_col) in enumerate(NEIGHBOURS[4:], start=4):
+            blocked = ~(shifted(self.walkable, d_row, 0, False) & shifted(self.walkable, 0, d_col, False))
+            costs[i][blocked] = UNREACHED
+        best = costs.argmin(axis=0)
+        offsets = NEIGHBOURS[best].astype(np.float64)
+        flow = np.stack([offsets[..., 1], offsets[..., 0]], axis=-1)
+        flow /= np.linalg.norm(flow, axis=-1, keepdims=True)
+        # Nowhere better to go: stuck, or already there.
+        flow[(costs.min(axis=0) >= self.distances) | (self.distances == UNREACHED)] = 0
+        return flow
+
+    def tiles_of(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ Window row and column of each point, and whether it's in the window """
+        size = self.game_map.tile_size
+        rows = np.floor(np.asarray(y) / size).astype(np.int64) - self.first_row
+        cols = np.floor(np.asarray(x) / size).astype(np.int64) - self.first_col
+        inside = (rows >= 0) & (rows < self.side) & (cols >= 0) & (cols < self.side)
+        return np.where(inside, rows, 0), np.where(inside, cols, 0), inside
+
+    def distance(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """ Tiles to walk from each point to the player, UNREACHED if there's no way """
+        rows, cols, inside = self.tiles_of(x, y)
+        return np.where(inside, self.distances[rows, cols], UNREACHED)
+
+    def directions(self, x: np.ndarray, y: np.ndarray, target: Tuple[float, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Unit (x, y) direction for each point to head towards the player at
+        target. Points next to the player's tile head straight for it.
+        """
+        rows, cols, inside = self.tiles_of(x, y)
+        flow = np.where(inside[:, None], self.flow[rows, cols], 0)
+        close = inside & (self.distances[rows, cols] <= 1)
+        if close.any():
+            straight = np.stack([target[0] - x[close], target[1] - y[close]], axis=1)
+            length = np.linalg.norm(straight, axis=1, keepdims=True)
+            flow[close] = np.divide(straight, length, out=np.zeros_like(straight), where=length > 0)
+        return flow[:, 0], flow[:, 1]
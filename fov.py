@@ -0,0 +1,106 @@
+from collections import OrderedDict
+from typing import NamedTuple, Tuple
+
+import numpy as np
+
+from config import config
+import tile_types
+
+
+class Visibility(NamedTuple):
+    """ What can be seen from one tile """
+    # World row and column of mask[0, 0].
+    first_row: int
+    first_col: int
+    # [row, column] over the square of tiles around the viewer, True if seen.
+    mask: np.ndarray
+
+    def visible(self, rows, cols) -> np.ndarray:
+        """ Whether each world tile can be seen, for arrays of any shape """
+        rows = np.asarray(rows, dtype=np.int64) - self.first_row
+        cols = np.asarray(cols, dtype=np.int64) - self.first_col
+        side = len(self.mask)
+        inside = (rows >= 0) & (rows < side) & (cols >= 0) & (cols < side)
+        seen = np.zeros(rows.shape, dtype=bool)
+        seen[inside] = self.mask[rows[inside], cols[inside]]
+        return seen
+
+
+# Ray tables by radius.
+_ray_tables = {}
+
+
+def ray_table(radius: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The tiles within radius of the centre of a (2 * radius + 1) square, and
+    for each one the tiles a straight line from the centre passes through
+    to get there. Both are flat indexes into the square; lines are padded
+    with side * side, one past the end. Made once per radius.
+    """
+    table = _ray_tables.get(radius)
+    if table is None:
+        side = 2 * radius + 1
+        rows, cols = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+        # A little past the radius, so the edge of the circle isn't lumpy.
+        inside = rows ** 2 + cols ** 2 <= radius * (radius + 1)
+        rows, cols = rows[inside], cols[inside]
+        steps = np.maximum(np.abs(rows), np.abs(cols))
+        # Every tile the line passes between the centre and the target.
+        along = np.arange(1, max(radius, 1))[None, :] / np.maximum(steps, 1)[:, None]
+        line_rows = np.rint(rows[:, None] * along).astype(np.int64) + radius
+        line_cols = np.rint(cols[:, None] * along).astype(np.int64) + radius
+        paths = np.where(along < 1, line_rows * side + line_cols, side * side)
+        targets = (rows + radius) * side + cols + radius
+        table = _ray_tables[radius] = (targets, paths)
+    return table
+
+
+class FieldOfView:
+    """
+    What the player can see, from a GameMap's `transparent` tiles.
+
+    A tile is seen if the straight line to it from the viewer only passes
+    over tiles that can be seen through (the tile itself can be a wall).
+    The lines for a radius are worked out once (see ray_table), so casting
+    is one lookup of every line in one go. Results are kept per (tile,
+    radius), so standing still or walking back and forth costs nothing,
+    and all of them are dropped when a tile's transparency changes.
+    """
+    def __init__(self, game_map, radius: int = config.FOV_RADIUS, cache_size: int = 64):
+        self.game_map = game_map
+        self.radius = radius
+        self.cache_size = cache_size
+        # Results by (row, column, radius), least recently used first.
+        self.cache: OrderedDict = OrderedDict()
+        self.version = game_map.transparent_version
+
+    def compute(self, row: int, col: int, radius: int = None) -> Visibility:
+        """ What can be seen from a tile """
+        radius = self.radius if radius is None else radius
+        if self.game_map.transparent_version != self.version:
+            self.cache.clear()
+            self.version = self.game_map.transparent_version
+        key = (row, col, radius)
+        visibility = self.cache.get(key)
+        if visibility is None:
+            visibility = self.cache[key] = self.cast(row, col, radius)
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        return visibility
+
+    def around(self, position: Tuple[float, float], radius: int = None) -> Visibility:
+        """ What can be seen from the tile a point (in pixels) is on """
+        size = self.game_map.tile_size
+        return self.compute(int(position[1] // size), int(position[0] // size), radius)
+
+    def cast(self, row: int, col: int, radius: int) -> Visibility:
+        side = 2 * radius + 1
+        targets, paths = ray_table(radius)
+        tiles = self.game_map.region(row - radius, col - radius, side, side)
+        # Plus the padding at the end, which never blocks.
+        transparent = np.append(tile_types.tiles["transparent"][tiles].ravel(), True)
+        mask = np.zeros(side * side, dtype=bool)
+        mask[targets] = transparent[paths].all(axis=1)
+        return Visibility(row - radius, col - radius, mask.reshape(side, side))
@@ -17,10 +17,13 @@ import os
 import arcade
 
 from config import config
-from entities import Monster, Player
+from culling import ViewCuller
+from level_prep import level_preparer
 import views
-from procgen import World
-from performance import FPSCounter      # Used if performance stats option is enabled.
+from procgen import LevelData
+from simulation import Simulation
+from performance import FPSCounter, profiler     # Used if performance stats option is enabled.
+from hud import PerformanceHUD
 
 
 class Game(arcade.View):
@@ -38,62 +41,58 @@ class Game(arcade.View):
         file_path = os.path.dirname(os.path.abspath(__file__))
         os.chdir(file_path)
 
-        self.grid = None
-        self.world_map = None
-        self.enemy_list = None
-        #self.world_objects = None
-        self.player_list = None
-        self.player_sprite = None
-        self.view_bottom = 0
-        self.view_left = 0
-        self.physics_engine = None
+        # Everything that moves. It doesn't need a window, so it can also be
+        # stepped on its own (see simulation.py).
+        self.sim = Simulation()
+        # The monsters on screen, the only ones drawn.
+        self.culler = ViewCuller()
+        self.music = None
+        self.current_player = None
+        self.score = 0
 
         # FPS performance monitor
         self.fps = FPSCounter()
+        self.hud = PerformanceHUD(self.fps) if config.SHOW_PERFORMANCE else None
+        # Timings are needed for the HUD and for telemetry.
+        self.measuring = config.SHOW_PERFORMANCE or config.TELEMETRY_TARGET is not None
     
+    @property
+    def game_map(self):
+        return self.sim.game_map
+
+    @property
+    def enemy_list(self):
+        return self.sim.enemy_list
+
+    @property
+    def player_list(self):
+        return self.sim.player_list
+
+    @property
+    def player_sprite(self):
+        return self.sim.player_sprite
+
+    @property
+    def view_left(self):
+        return self.sim.view_left
+
+    @property
+    def view_bottom(self):
+        return self.sim.view_bottom
+
     def on_show(self):
         arcade.set_background_color(config.BACKGROUND_COLOR)
 
-    def setup(self):
-        """ Set up the game """
-        self.world_map = arcade.SpriteList(use_spatial_hash=True)
-        self.enemy_list = arcade.SpriteList(use_spatial_hash=False)
-        #self.world_objects = arcade.SpriteList(use_spatial_hash=True)
-        self.player_list = arcade.SpriteList()
-
-        world = World()
-        # Generate trees at random in world
-        world.place_random_trees()
-        #self.world_objects.extend(world.place_trees())
-        #self.world_map.extend(world.place_random_trees())
-        # Generate world forest(s).
-        '''
-        world.generate_forest((10, 10), 8)
-        world.generate_forest((20, 20), 6)
-        '''
-        # Add the tree(s) and forest(s) to the world.
-        self.world_map.extend(world.tree_list)
-
-        # Create cave system using a 2D grid
-        #dg = RLDungeonGenerator(config=config)
-        '''
-        dg.generate_map()
-
-        # This is the simple-to-understand method. Each grid location
-        # is a sprite.
-        self.world_map = dg.build_map()
-        '''
-        # Set up the player
-        self.player_sprite = Player()
-        self.player_list.append(self.player_sprite)
-        self.enemy_list.append(Monster())
-
-        # Place the player randomly in the map
-        #dg.place_player(self.player_sprite, self.world_map, config)
-
-        self.physics_engine = arcade.PhysicsEngineSimple(self.player_sprite,
-                                                         self.world_map)
-        
+    def setup(self, level: LevelData = None):
+        """
+        Set up the game. Dungeon levels come ready made from the level
+        preparer, which starts on the next one straight away.
+        """
+        if not config.OPEN_WORLD and level is None:
+            level = level_preparer.take()
+        self.sim.setup(level)
+        self.culler = ViewCuller()
+
     def on_draw(self):
         """ Render the screen. """
 
@@ -104,23 +103,34 @@ class Game(arcade.View):
         # the screen to the background color, and erase what we drew last frame.
         arcade.start_render()
 
-        # Draw the sprites
-        self.world_map.draw(pixelated=True)
-        #self.world_objects.draw()
-        self.enemy_list.draw(pixelated=True)
-        self.player_list.draw(pixelated=True)
-        # draw healthbar above enemy
-        for entity in self.enemy_list:
-            entity.on_draw()
-        # draw healthbar above player
-        self.player_sprite.on_draw()
+        # Draw the sprites, only what's on screen
+        with profiler.scope("draw"):
+            with profiler.scope("cull"):
+                self.culler.update(self.sim.grid, self.view_left, self.view_bottom)
+            with profiler.scope("map"):
+                self.game_map.draw(self.view_left, self.view_bottom)
+            #self.world_objects.draw()
+            with profiler.scope("enemies"):
+                self.culler.sprite_list.draw(pixelated=True)
+            with profiler.scope("player"):
+                self.player_list.draw(pixelated=True)
+            with profiler.scope("health_bars"):
+                # draw the healthbars above the enemies and the player
+                self.sim.health_bars.draw(self.culler.health_bar_slots(self.player_sprite))
 
         if config.SHOW_PERFORMANCE:
             # Draw hit boxes.
             self.player_sprite.draw_hit_box(arcade.color.RED, 3)
+            with profiler.scope("hud"):
+                self.hud.draw(self.view_left, self.view_bottom)
+
+        if self.measuring:
             # update timings for FPS performance stats
             self.fps.set_draw_time()
+            # Sprites actually drawn this frame.
+            self.fps.set_sprite_count(len(self.culler) + len(self.player_list))
             self.fps.tick()
+            self.fps.record_frame(enemies=len(self.enemy_list), seed=self.sim.seed)
 
     def on_key_press(self, key, modifiers):
         """Called whenever a key is pressed. """
@@ -145,52 +155,8 @@ class Game(arcade.View):
         # Start update timer
         self.fps.set_start_time()
 
-        # Move the player
-        #self.player_list.update()
-        self.physics_engine.update()
-
-        # update player animations
-        self.player_sprite.on_update(delta_time)
-        self.player_sprite.update_animation(delta_time)
-
-        # update enemy sprites
-        self.enemy_list.update()
-        self.enemy_list.on_update(delta_time)
-
-        player_collision_list = arcade.check_for_collision_with_list(self.player_sprite, self.enemy_list)
-        if len(player_collision_list) > 0:
-            for enemy in player_collision_list:
-                self.player_sprite.attack(enemy)
-
-        # --- Manage Scrolling ---
-
-        # Track if we need to change the viewport
-        changed = False
-
-        # Scroll left
-        left_bndry = self.view_left + config.VIEWPORT_MARGIN
-        if self.player_sprite.center_x < left_bndry:
-            self.view_left -= left_bndry - self.player_sprite.center_x
-            changed = True
-
-        # Scroll right
-        right_bndry = self.view_left + config.WINDOW_WIDTH - config.VIEWPORT_MARGIN
-        if self.player_sprite.center_x > right_bndry:
-            self.view_left += self.player_sprite.center_x - right_bndry
-            changed = True
-
-        # Scroll up
-        top_bndry = self.view_bottom + config.WINDOW_HEIGHT - config.VIEWPORT_MARGIN
-        if self.player_sprite.center_y > top_bndry:
-            self.view_bottom += self.player_sprite.center_y - top_bndry
-            changed = True
-
-        # Scroll down
-        bottom_bndry = self.view_bottom + config.VIEWPORT_MARGIN
-        if self.player_sprite.center_y < bottom_bndry:
-            self.view_bottom -= bottom_bndry - self.player_sprite.center_y
-            changed = True
-
+        with profiler.scope("update"):
+            changed = self.sim.step(delta_time)
         if changed:
             arcade.set_viewport(self.view_left,
                                 config.WINDOW_WIDTH + self.view_left,
@@ -198,9 +164,11 @@ class Game(arcade.View):
                                 config.WINDOW_HEIGHT + self.view_bottom)
 
         # Performance stats
-        if config.SHOW_PERFORMANCE:
+        if self.measuring:
             # Save the time it took to do this.
             self.fps.set_processing_time()
+            if self.hud is not None:
+                self.hud.update(delta_time)
             # Total time program has been running.
             self.fps.set_total_program_time()
             # Get current FPS.
@@ -211,8 +179,7 @@ class Game(arcade.View):
                 # before taking readings
                 if self.fps.get_total_program_time() > 5 and \
                     self.fps.get_total_program_time() % 2 == 1:
-                        # Get timings. Optionally can print to file.
-                        self.fps.get_timings()
+                        # Keep a reading for the history. The timings are on the HUD.
                         self.fps.update()
 
 
@@ -0,0 +1,196 @@
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from config import config
+from tile_layer import TileLayer
+import tile_types
+
+
+class Chunk:
+    """ A CHUNK_SIZE x CHUNK_SIZE square of the world """
+    def __init__(self, cx: int, cy: int, tiles: np.ndarray, tile_size: float):
+        self.cx = cx
+        self.cy = cy
+        # Tile ids, indexed [row, column] with row 0 at the bottom.
+        self.tiles = tiles
+        self.tile_size = tile_size
+        self.origin = (cx * tiles.shape[1] * tile_size, cy * tiles.shape[0] * tile_size)
+        self._layer = None
+
+    @property
+    def layer(self) -> TileLayer:
+        """ Tile layer for drawing the chunk, built the first time it's needed """
+        if self._layer is None:
+            self._layer = TileLayer(self.tiles, self.tile_size, self.origin)
+        return self._layer
+
+    def reset(self):
+        """ Drop the layer, after the tiles have changed """
+        self._layer = None
+
+    def draw(self):
+        self.layer.draw()
+
+
+class GameMap:
+    """
+    The world, split into fixed-size chunks. Only chunks around the camera
+    are kept: they're generated (or cut from a stored level) when the camera
+    gets near and dropped, least recently used first, once more than
+    max_chunks are loaded. Memory and per-frame cost follow what's near the
+    camera, not the size of the world.
+    """
+    def __init__(
+        self,
+        generator: Callable[[int, int, int], np.ndarray],
+        chunk_size: int = config.CHUNK_SIZE,
+        max_chunks: int = config.MAX_LOADED_CHUNKS,
+        tile_size: float = config.TILE_SIZE,
+    ):
+        # generator(cx, cy, chunk_size) returns the chunk's tile ids. It must
+        # return the same tiles every time, as evicted chunks are rebuilt.
+        self.generator = generator
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.tile_size = tile_size
+        # Loaded chunks by (cx, cy), least recently used first.
+        self.chunks: OrderedDict = OrderedDict()
+        # Tiles changed with set_tile, by chunk then (row, column) in the
+        # chunk, so they survive the chunk being dropped and rebuilt.
+        self.edits: Dict[Tuple[int, int], Dict[Tuple[int, int], int]] = {}
+        # Bumped whenever a tile changes whether it can be walked over or
+        # seen through, so anything worked out from those knows to redo it.
+        self.walkable_version = 0
+        self.transparent_version = 0
+        self.visible: List[Chunk] = []
+        self.visible_range = None
+
+    @classmethod
+    def from_grid(cls, grid: np.ndarray, fill: int = tile_types.ROCK, **kwargs) -> "GameMap":
+        """ Stream a level that's already in memory, with `fill` all around it """
+        def cut_chunk(cx, cy, chunk_size):
+            tiles = np.full((chunk_size, chunk_size), fill, dtype=np.uint8)
+            row, col = cy * chunk_size, cx * chunk_size
+            part = grid[max(row, 0):max(row + chunk_size, 0), max(col, 0):max(col + chunk_size, 0)]
+            tiles[max(-row, 0):max(-row, 0) + part.shape[0], max(-col, 0):max(-col, 0) + part.shape[1]] = part
+            return tiles
+        return cls(cut_chunk, **kwargs)
+
+    @property
+    def chunk_pixels(self) -> float:
+        return self.chunk_size * self.tile_size
+
+    def get_chunk(self, cx: int, cy: int) -> Chunk:
+        """ Get a chunk, generating it if it isn't loaded """
+        key = (cx, cy)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            tiles = self.generator(cx, cy, self.chunk_size)
+            for (row, col), tile in self.edits.get(key, {}).items():
+                tiles[row, col] = tile
+            chunk = self.chunks[key] = Chunk(cx, cy, tiles, self.tile_size)
+        else:
+            self.chunks.move_to_end(key)
+        return chunk
+
+    def region(self, first_row: int, first_col: int, rows: int, cols: int) -> np.ndarray:
+        """ Tile ids of a rectangle of the world, [row, column] from its bottom left """
+        size = self.chunk_size
+        tiles = np.empty((rows, cols), dtype=np.uint8)
+        for cy in range(first_row // size, (first_row + rows - 1) // size + 1):
+            for cx in range(first_col // size, (first_col + cols - 1) // size + 1):
+                chunk = self.get_chunk(cx, cy)
+                # The part of the rectangle in this chunk, in world tiles.
+                row0, row1 = max(first_row, cy * size), min(first_row + rows, (cy + 1) * size)
+                col0, col1 = max(first_col, cx * size), min(first_col + cols, (cx + 1) * size)
+                tiles[row0 - first_row:row1 - first_row, col0 - first_col:col1 - first_col] = chunk.tiles[
+                    row0 - cy * size:row1 - cy * size, col0 - cx * size:col1 - cx * size]
+        return tiles
+
+    def set_tile(self, row: int, col: int, tile: int):
+        """ Change one tile of the world, e.g. to open a door """
+        size = self.chunk_size
+        cx, cy = col // size, row // size
+        local = (row - cy * size, col - cx * size)
+        chunk = self.get_chunk(cx, cy)
+        before, after = tile_types.tiles[chunk.tiles[local]], tile_types.tiles[tile]
+        if before["walkable"] != after["walkable"]:
+            self.walkable_version += 1
+        if before["transparent"] != after["transparent"]:
+            self.transparent_version += 1
+        self.edits.setdefault((cx, cy), {})[local] = tile
+        chunk.tiles[local] = tile
+        # Redo the chunk's drawing.
+        chunk.reset()
+
+    def walkable_at(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """
+        Whether each tile (by world row and column) can be walked over,
+        for arrays of any shape. Looks the tiles up chunk by chunk,
+        generating any that aren't loaded.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        size = self.chunk_size
+        cx, cy = cols // size, rows // size
+        _, first, inverse = np.unique((cx * (1 << 32) + cy).ravel(), return_index=True, return_inverse=True)
+        inverse = inverse.reshape(rows.shape)
+        walkable = np.empty(rows.shape, dtype=bool)
+        for i, (chunk_cx, chunk_cy) in enumerate(zip(cx.ravel()[first].tolist(), cy.ravel()[first].tolist())):
+            tiles = self.get_chunk(chunk_cx, chunk_cy).tiles
+            here = inverse == i
+            walkable[here] = tile_types.tiles["walkable"][
+                tiles[rows[here] - chunk_cy * size, cols[here] - chunk_cx * size]]
+        return walkable
+
+    def chunk_range(self, left: float, bottom: float, width: float, height: float) -> Tuple[int, int, int, int]:
+        """ First and last chunk columns and rows covering a rectangle (in pixels) """
+        size = self.chunk_pixels
+        return (
+            int(left // size), int(bottom // size),
+            int((left + width) // size), int((bottom + height) // size),
+        )
+
+    def update(self, view_left: float, view_bottom: float,
+               width: float = config.WINDOW_WIDTH, height: float = config.WINDOW_HEIGHT):
+        """ Load the chunks around the viewport and drop the stale ones """
+        first_cx, first_cy, last_cx, last_cy = self.chunk_range(view_left, view_bottom, width, height)
+        margin = config.CHUNK_LOAD_MARGIN
+        chunk_range = (first_cx - margin, first_cy - margin, last_cx + margin, last_cy + margin)
+        # Nothing to do until the camera crosses into another chunk.
+        if chunk_range == self.visible_range:
+            return
+        self.visible_range = chunk_range
+
+        self.visible = [
+            self.get_chunk(cx, cy)
+            for cy in range(chunk_range[1], chunk_range[3] + 1)
+            for cx in range(chunk_range[0], chunk_range[2] + 1)
+        ]
+        self.evict()
+
+    def evict(self):
+        """ Drop least recently used chunks, never the visible ones """
+        visible = set(map(id, self.visible))
+        limit = max(self.max_chunks, len(self.visible))
+        for key in list(self.chunks):
+            if len(self.chunks) <= limit:
+                break
+            if id(self.chunks[key]) not in visible:
+                del self.chunks[key]
+
+    def draw(self, view_left: float = None, view_bottom: float = None,
+             width: float = config.WINDOW_WIDTH, height: float = config.WINDOW_HEIGHT):
+        """ Draw the loaded chunks, or only the ones on screen if given the view """
+        if view_left is None:
+            for chunk in self.visible:
+                chunk.draw()
+            return
+        first_cx, first_cy, last_cx, last_cy = self.chunk_range(view_left, view_bottom, width, height)
+        for cy in range(first_cy, last_cy + 1):
+            for cx in range(first_cx, last_cx + 1):
+                chunk = self.chunks.get((cx, cy))
+                if chunk is not None:
+                    chunk.draw()
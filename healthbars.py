@@ -0,0 +1,203 @@
+import arcade
+from arcade.gl import BufferDescription
+import numpy as np
+
+# Each bar is one instance of a unit quad, carrying the entity's centre,
+# scale and how full the bar is. The fragment shader draws the outline and
+# the filled part, the same as BaseEntity.on_draw does with two rectangles.
+VERTEX_SHADER = """
+#version 330
+
+uniform Projection {
+    uniform mat4 matrix;
+} proj;
+
+in vec2 in_corner;
+in vec2 in_center;
+in float in_scale;
+in float in_fraction;
+
+out vec2 v_local;
+out float v_scale;
+out float v_fraction;
+
+void main() {
+    // 16 x 4 (times the entity's scale), 16 above the entity's centre.
+    vec2 size = vec2(16.0, 4.0) * in_scale;
+    vec2 center = in_center + vec2(0.0, 16.0 * in_scale);
+    v_local = (in_corner - 0.5) * (size + 1.0);
+    v_scale = in_scale;
+    v_fraction = in_fraction;
+    gl_Position = proj.matrix * vec4(center + v_local, 0.0, 1.0);
+}
+"""
+
+FRAGMENT_SHADER = """
+#version 330
+
+in vec2 v_local;
+in float v_scale;
+in float v_fraction;
+
+out vec4 f_color;
+
+void main() {
+    vec2 half_size = vec2(8.0, 2.0) * v_scale;
+    if (abs(v_local.x) >= half_size.x - 0.5 || abs(v_local.y) >= half_size.y - 0.5) {
+        // One pixel outline
+        f_color = vec4(1.0, 1.0, 1.0, 1.0);
+        return;
+    }
+    float left = -7.0 * v_scale;
+    if (v_local.x <= left + 14.0 * v_scale * v_fraction && abs(v_local.y) <= v_scale) {
+        f_color = vec4(0.0, 1.0, 0.0, 1.0);
+        return;
+    }
+    discard;
+}
+"""
+
+
+class HealthBarLayer:
+    """
+    Health bars for a group of entities, drawn with one instanced draw call.
+
+    Each entity added gets a slot in one array of bar data. An entity writes
+    its slot when its hp or position changes (see BaseEntity), and only the
+    slots written since the last frame are uploaded. Batch movers write
+    all their bars in one go with update_many(). The array is kept in
+    plain numpy, so the layer works without a window until it's drawn.
+
+    Given the slots on screen, draw() instead uploads just those bars to a
+    second buffer and draws them, so the cost follows what's on screen.
+    """
+    # x, y, scale, fraction of hp left
+    FIELDS = 4
+
+    def __init__(self, capacity: int = 64):
+        self.data = np.zeros((capacity, self.FIELDS), dtype=np.float32)
+        self.entities = []
+        # Bumped whenever an entity's slot changes, so anything holding on to
+        # slots (see EntityStore) knows to look them up again.
+        self.version = 0
+        # Slots written since the last upload, as a range.
+        self.dirty_start = capacity
+        self.dirty_end = 0
+        self.ctx = None
+        self.program = None
+        self.corners = None
+        self.buffer = None
+        self.geometry = None
+        # Only the bars on screen, see draw().
+        self.visible_buffer = None
+        self.visible_geometry = None
+
+    def __len__(self):
+        return len(self.entities)
+
+    def add(self, entity):
+        if len(self.entities) == len(self.data):
+            # Double up, and upload all of it next time.
+            self.data = np.resize(self.data, (len(self.data) * 2, self.FIELDS))
+            self.geometry = None
+        entity.health_bar = self
+        entity.health_bar_slot = len(self.entities)
+        self.entities.append(entity)
+        self.version += 1
+        self.update(entity)
+
+    def extend(self, entities):
+        for entity in entities:
+            self.add(entity)
+
+    def remove(self, entity):
+        """ Drop an entity's bar, moving the last bar into its slot """
+        slot = entity.health_bar_slot
+        last = self.entities.pop()
+        if last is not entity:
+            self.entities[slot] = last
+            last.health_bar_slot = slot
+            self.data[slot] = self.data[len(self.entities)]
+            self.mark_dirty(slot)
+        entity.health_bar = None
+        entity.health_bar_slot = None
+        self.version += 1
+
+    def update(self, entity):
+        """ Write an entity's bar from its current position and hp """
+        slot = entity.health_bar_slot
+        x, y = entity.position
+        self.data[slot] = (x, y, entity.scale, entity.hp / entity.max_hp)
+        self.mark_dirty(slot)
+
+    def update_many(self, slots: np.ndarray, x: np.ndarray, y: np.ndarray, fraction: np.ndarray = None):
+        """
+        Write the positions (and, if given, the fraction of hp left) of many
+        bars at once, e.g. everything an EntityStore moved this frame.
+        """
+        if len(slots) == 0:
+            return
+        self.data[slots, 0] = x
+        self.data[slots, 1] = y
+        if fraction is not None:
+            self.data[slots, 3] = fraction
+        self.mark_dirty(int(slots.min()))
+        self.mark_dirty(int(slots.max()))
+
+    def mark_dirty(self, slot: int):
+        if slot < self.dirty_start:
+            self.dirty_start = slot
+        if slot >= self.dirty_end:
+            self.dirty_end = slot + 1
+
+    def build(self):
+        """ GL objects, made on the first draw (and when the array outgrows the buffer) """
+        if self.ctx is None:
+            self.ctx = arcade.get_window().ctx
+            self.program = self.ctx.program(vertex_shader=VERTEX_SHADER, fragment_shader=FRAGMENT_SHADER)
+            self.corners = self.ctx.buffer(data=np.array([0, 0, 1, 0, 0, 1, 1, 1], dtype=np.float32).tobytes())
+        self.buffer = self.ctx.buffer(data=self.data.tobytes())
+        self.geometry = self.ctx.geometry(
+            [
+                BufferDescription(self.corners, "2f", ["in_corner"]),
+                BufferDescription(self.buffer, "2f 1f 1f", ["in_center", "in_scale", "in_fraction"], instanced=True),
+            ],
+            mode=self.ctx.TRIANGLE_STRIP,
+        )
+        self.dirty_start, self.dirty_end = len(self.data), 0
+
+    def build_visible(self, count: int):
+        """ A buffer for `count` bars (rounded up), for drawing just the ones on screen """
+        if self.ctx is None:
+            self.build()
+        size = 2 ** max(count - 1, 1).bit_length()
+        self.visible_buffer = self.ctx.buffer(reserve=size * self.FIELDS * self.data.itemsize)
+        self.visible_geometry = self.ctx.geometry(
+            [
+                BufferDescription(self.corners, "2f", ["in_corner"]),
+                BufferDescription(self.visible_buffer, "2f 1f 1f", ["in_center", "in_scale", "in_fraction"],
+                                  instanced=True),
+            ],
+            mode=self.ctx.TRIANGLE_STRIP,
+        )
+
+    def draw(self, slots=None):
+        """ Draw every bar, or only those in `slots` (e.g. the ones on screen) """
+        if not self.entities:
+            return
+        if slots is not None:
+            if len(slots) == 0:
+                return
+            data = self.data[slots]
+            if self.visible_buffer is None or self.visible_buffer.size < data.nbytes:
+                self.build_visible(len(slots))
+            self.visible_buffer.write(data.tobytes())
+            self.visible_geometry.render(self.program, vertices=4, instances=len(slots))
+            return
+        if self.geometry is None:
+            self.build()
+        elif self.dirty_start < self.dirty_end:
+            stride = self.data.itemsize * self.FIELDS
+            self.buffer.write(self.data[self.dirty_start:self.dirty_end].tobytes(), offset=self.dirty_start * stride)
+            self.dirty_start, self.dirty_end = len(self.data), 0
+        self.geometry.render(self.program, vertices=4, instances=len(self.entities))
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+"""
+Hit boxes for every sprite image, worked out ahead of time.
+
+arcade works out a texture's hit box by scanning the image's alpha channel
+the first time a sprite uses it. This tool does that scan once for every
+sprite image under assets/gfx and stores the polygons next to the assets;
+the game loads them at startup and hands them to the textures, so no image
+is ever scanned while playing. Entries are keyed by the file's SHA-1 and the hit
+box algorithm, so an edited image is simply scanned again at runtime
+until the tool is re-run:
+
+python hitbox_cache.py
+python hitbox_cache.py --algorithm Detailed --detail 4.5
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+from typing import Optional
+
+import arcade
+from PIL import Image
+
+from config import config
+
+FORMAT_VERSION = 1
+# What the tool scans by default: sprite images only, not the menu
+# background or the tile set's preview pictures.
+SPRITE_GLOBS = ("assets/gfx/tile_*.png", "assets/gfx/player/*.png")
+# arcade has no public way to give a texture its hit box, so load_texture
+# sets the private Texture._hit_box_points that Texture.hit_box_points
+# fills in on first use. That's how arcade 2.6 works (2.6.5 is pinned in
+# requirements.txt); on any other version the cache is skipped and arcade
+# scans the images itself.
+SETS_TEXTURE_HIT_BOXES = arcade.version.VERSION.startswith("2.6.")
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+def algorithm_key(algorithm: str, detail: float) -> str:
+    # Detail only changes what the detailed algorithm makes.
+    return f"Detailed:{detail}" if algorithm == "Detailed" else algorithm
+
+
+def calculate_hit_box(path: str, algorithm: str = "Simple", detail: float = 4.5) -> tuple:
+    """ The hit box arcade would work out for this image """
+    image = Image.open(path).convert("RGBA")
+    if algorithm == "Detailed":
+        points = arcade.calculate_hit_box_points_detailed(image, detail)
+    else:
+        points = arcade.calculate_hit_box_points_simple(image)
+    return tuple((float(x), float(y)) for x, y in points)
+
+
+class HitBoxCache:
+    """ Hit box polygons by image path, checked against the image's hash """
+    def __init__(self, path: str = config.HIT_BOX_CACHE):
+        self.path = path
+        # Loaded the first time it's needed, as the path is relative to the game.
+        self.files = None
+        # Hashes checked this run, so each file is only hashed once.
+        self.checked = {}
+
+    def load(self):
+        self.files = {}
+        try:
+            with open(self.path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == FORMAT_VERSION:
+            self.files = data["files"]
+
+    def save(self):
+        with open(self.path, "w") as file:
+            json.dump({"version": FORMAT_VERSION, "files": self.files}, file, indent=1, sort_keys=True)
+            file.write("\n")
+
+    def get(self, path: str, algorithm: str = "Simple", detail: float = 4.5) -> Optional[tuple]:
+        """ The stored hit box, or None if there isn't one for this version of the image """
+        if self.files is None:
+            self.load()
+        path = os.path.normpath(path)
+        entry = self.files.get(path)
+        if entry is None:
+            return None
+        points = entry["hit_boxes"].get(algorithm_key(algorithm, detail))
+        if points is None:
+            return None
+        if path not in self.checked:
+            try:
+                self.checked[path] = file_hash(path) == entry["sha1"]
+            except OSError:
+                self.checked[path] = False
+        return tuple(map(tuple, points)) if self.checked[path] else None
+
+    def add(self, path: str, algorithm: str = "Simple", detail: float = 4.5):
+        """ Scan an image and store its hit box """
+        if self.files is None:
+            self.load()
+        path = os.path.normpath(path)
+        sha1 = file_hash(path)
+        entry = self.files.get(path)
+        if entry is None or entry["sha1"] != sha1:
+            entry = self.files[path] = {"sha1": sha1, "hit_boxes": {}}
+        entry["hit_boxes"][algorithm_key(algorithm, detail)] = calculate_hit_box(path, algorithm, detail)
+        self.checked[path] = True
+
+    def load_texture(self, path: str, algorithm: str = "Simple", detail: float = 4.5) -> arcade.Texture:
+        """ arcade.load_texture, with the hit box filled in from the cache """
+        texture = arcade.load_texture(path, hit_box_algorithm=algorithm, hit_box_detail=detail)
+        if SETS_TEXTURE_HIT_BOXES and texture._hit_box_points is None and algorithm in ("Simple", "Detailed"):
+            texture._hit_box_points = self.get(path, algorithm, detail)
+        return texture
+
+
+hit_box_cache = HitBoxCache()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Work out the hit box of every sprite image and store them.")
+    parser.add_argument("images", nargs="*", help="images to scan (default: every sprite image, see SPRITE_GLOBS)")
+    parser.add_argument("--algorithm", choices=["Simple", "Detailed"], default="Simple")
+    parser.add_argument("--detail", type=float, default=4.5, help="detail for the Detailed algorithm")
+    args = parser.parse_args()
+
+    # Paths are stored relative to the game, same as the game loads them.
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    if args.images:
+        images = args.images
+    else:
+        images = sorted(path for pattern in SPRITE_GLOBS for path in glob.glob(pattern))
+        # Images that are gone (or aren't sprites) drop out of the file.
+        hit_box_cache.load()
+        hit_box_cache.files = {path: entry for path, entry in hit_box_cache.files.items() if path in images}
+    for path in images:
+        hit_box_cache.add(path, args.algorithm, args.detail)
+    hit_box_cache.save()
+    print(f"{len(images)} hit boxes written to {hit_box_cache.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import os
+
+import arcade
+import pyglet
+
+from config import config
+from performance import FPSCounter, profiler
+
+
+def memory_usage():
+    """ Resident memory of the game in bytes, or None where it can't be read """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class PerformanceHUD:
+    """
+    FPS, phase timings, sprite counts and memory, drawn over the game.
+
+    The labels are made once and share a batch, so drawing the whole HUD is
+    a single draw call. The text is only re-formatted every `refresh`
+    seconds, and a label is only re-laid out when its text has changed.
+    """
+    def __init__(self, fps: FPSCounter, refresh: float = 0.25, font_size: int = 10,
+                 x: float = 10, top: float = config.WINDOW_HEIGHT - 10):
+        self.fps = fps
+        self.refresh = refresh
+        self.font_size = font_size
+        self.x = x
+        self.top = top
+        self.line_height = font_size * 1.6
+        self.batch = pyglet.graphics.Batch()
+        self.labels = []
+        self.texts = []
+        self.since_refresh = refresh
+
+    def label(self, line: int) -> pyglet.text.Label:
+        """ The label for a line of the HUD, made the first time it's used """
+        while len(self.labels) <= line:
+            self.labels.append(pyglet.text.Label(
+                "", font_name=("Courier New", "Courier", "monospace"), font_size=self.font_size,
+                x=self.x, y=self.top - len(self.labels) * self.line_height, anchor_y="top",
+                color=(255, 255, 255, 255), batch=self.batch))
+            self.texts.append("")
+        return self.labels[line]
+
+    def lines(self) -> list:
+        stats = self.fps.get_stats()
+        frame, processing, drawing = stats["frame"], stats["processing"], stats["drawing"]
+        memory = memory_usage()
+        lines = [
+            f"FPS {stats['fps']:5.1f}   frame p50 {frame['p50'] * 1000:6.2f} p99 {frame['p99'] * 1000:6.2f} ms",
+            f"update  p50 {processing['p50'] * 1000:6.2f} p95 {processing['p95'] * 1000:6.2f} "
+            f"max {processing['max'] * 1000:6.2f} ms",
+            f"draw    p50 {drawing['p50'] * 1000:6.2f} p95 {drawing['p95'] * 1000:6.2f} "
+            f"max {drawing['max'] * 1000:6.2f} ms",
+        ]
+        for path, phase in profiler.get_timings().items():
+            lines.append(f"  {path:<22} {phase['p50'] * 1000:6.3f} p95 {phase['p95'] * 1000:6.3f} ms")
+        lines.append(f"sprites {self.fps.sprite_counts.last:.0f}   "
+                     f"memory {'n/a' if memory is None else f'{memory / 2 ** 20:.1f} MB'}")
+        return lines
+
+    def update(self, delta_time: float):
+        self.since_refresh += delta_time
+        if self.since_refresh < self.refresh:
+            return
+        self.since_refresh = 0
+
+        lines = self.lines()
+        for line, text in enumerate(lines):
+            label = self.label(line)
+            if self.texts[line] != text:
+                self.texts[line] = text
+                label.text = text
+        # Blank any lines left over from before.
+        for line in range(len(lines), len(self.labels)):
+            if self.texts[line]:
+                self.texts[line] = ""
+                self.labels[line].text = ""
+
+    def draw(self, view_left: float = 0, view_bottom: float = 0):
+        """ Draw in screen coordinates, whatever the game's viewport """
+        arcade.set_viewport(0, config.WINDOW_WIDTH, 0, config.WINDOW_HEIGHT)
+        with arcade.get_window().ctx.pyglet_rendering():
+            self.batch.draw()
+        arcade.set_viewport(view_left, config.WINDOW_WIDTH + view_left,
+                            view_bottom, config.WINDOW_HEIGHT + view_bottom)
@@ -0,0 +1,98 @@
+import atexit
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+import random
+
+import numpy as np
+
+from config import config
+from map_cache import MapCache, cache_enabled
+from procgen import LevelData, RLDungeonGenerator
+
+
+def generate_level(level_config, shm_name, seed):
+    """
+    Runs in the worker process. Generates (or loads) a level and writes its
+    tile grid straight into the shared memory block; only the small room,
+    spawn and door tables go back through the result.
+    """
+    if cache_enabled(level_config):
+        level = MapCache(level_config.MAP_CACHE_DIR, level_config.MAP_CACHE_MAX_FILES).get_or_generate(seed, level_config)
+    else:
+        dg = RLDungeonGenerator(level_config, seed)
+        dg.generate_map()
+        level = dg.level_data()
+
+    shm = SharedMemory(name=shm_name)
+    try:
+        tiles = np.ndarray(level.tiles.shape, dtype=np.uint8, buffer=shm.buf)
+        tiles[:] = level.tiles
+        # The view has to go before the block can be closed.
+        del tiles
+    finally:
+        shm.close()
+    return np.array(level.rooms), np.array(level.spawns), np.array(level.doors)
+
+
+class LevelPreparer:
+    """
+    Generates the next level in a worker process while the current one is
+    being played, so starting a level only has to swap in finished data.
+    """
+    def __init__(self, level_config=config):
+        self.config = level_config
+        # Level seeds come from their own stream, so a fixed SEED replays the
+        # same run of levels.
+        self.seed_rng = random.Random(level_config.SEED)
+        self.executor = None
+        # (future, shared memory, grid shape, seed) of the level being prepared
+        self.pending = None
+
+    def prepare(self):
+        """ Start generating the next level, unless one is already on its way """
+        if self.pending is not None:
+            return
+        if self.executor is None:
+            # Spawn rather than fork, the parent has a GL context and threads.
+            self.executor = ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn"))
+            # There's always a level being prepared, so tidy it up on the way out.
+            atexit.register(self.shutdown)
+        shape = (self.config.GRID_HEIGHT, self.config.GRID_WIDTH)
+        shm = SharedMemory(create=True, size=shape[0] * shape[1])
+        seed = self.seed_rng.getrandbits(64)
+        future = self.executor.submit(generate_level, self.config, shm.name, seed)
+        self.pending = (future, shm, shape, seed)
+
+    def take(self) -> LevelData:
+        """
+        Hand over the prepared level, waiting for it if it isn't finished yet,
+        and start preparing the one after.
+        """
+        self.prepare()
+        future, shm, shape, seed = self.pending
+        self.pending = None
+        try:
+            rooms, spawns, doors = future.result()
+            tiles = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+        self.prepare()
+        return LevelData(tiles, rooms.view(np.recarray), spawns, seed, doors.view(np.recarray))
+
+    def shutdown(self):
+        """ Drop the level being prepared, free its shared memory and stop the worker """
+        if self.pending is not None:
+            future, shm = self.pending[:2]
+            future.cancel()
+            shm.close()
+            shm.unlink()
+            self.pending = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+            atexit.unregister(self.shutdown)
+
+
+level_preparer = LevelPreparer()
@@ -0,0 +1,143 @@
+import hashlib
+import os
+import struct
+from typing import Optional
+
+import numpy as np
+
+from config import config
+from procgen import LevelData, RLDungeonGenerator, door_dt, room_dt
+
+'''
+Cache of generated dungeon levels on disk, so a known seed loads instead of
+being generated again.
+
+File layout (little-endian), one level per file:
+  header   magic, format version, parameter hash, width, height,
+           room count, spawn count, door count (HEADER below)
+  tiles    height * width uint8 tile ids
+  rooms    room count * (row, col, height, width) int32, 4-byte aligned
+  spawns   spawn count * (row, col) int32
+  doors    door count * (room_a, row_a, col_a, room_b, row_b, col_b) int32
+Arrays are memory mapped on load, so only the parts of a level that get
+used are actually read.
+'''
+
+MAGIC = b"ARLMAP"
+# Bump whenever the file layout or the generator's output changes, so old
+# files are regenerated rather than loaded.
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<6sH8sIIIII")
+ROOM_DT = room_dt.newbyteorder("<")
+DOOR_DT = door_dt.newbyteorder("<")
+SPAWN_DT = np.dtype("<i4")
+
+
+def generator_params(level_config) -> tuple:
+    """ Everything besides the seed that changes what the generator makes """
+    return (
+        FORMAT_VERSION,
+        level_config.GRID_WIDTH,
+        level_config.GRID_HEIGHT,
+        level_config.DUNGEON_CONNECT_STRATEGY,
+        level_config.DUNGEON_EXTRA_LOOPS,
+        level_config.BSP_SUBTREE_SIZE,
+    )
+
+
+def cache_enabled(level_config) -> bool:
+    """ Whether to use the cache: only with a fixed seed, or nothing would ever be loaded again """
+    return level_config.USE_MAP_CACHE and level_config.SEED is not None
+
+
+def _align(offset: int, size: int = 4) -> int:
+    return (offset + size - 1) // size * size
+
+
+class MapCache:
+    """
+    Generated levels on disk, keyed by (seed, generator parameters). Keeps
+    at most max_files levels, dropping the least recently used.
+    """
+    def __init__(self, directory: str = config.MAP_CACHE_DIR, max_files: int = config.MAP_CACHE_MAX_FILES):
+        self.directory = directory
+        self.max_files = max_files
+
+    def key(self, seed: int, level_config) -> bytes:
+        return hashlib.sha1(repr((seed, generator_params(level_config))).encode()).digest()[:8]
+
+    def path(self, seed: int, level_config) -> str:
+        return os.path.join(self.directory, f"{self.key(seed, level_config).hex()}.map")
+
+    def load(self, seed: int, level_config) -> Optional[LevelData]:
+        """ The cached level, or None if it isn't cached (or the file is stale) """
+        path = self.path(seed, level_config)
+        try:
+            with open(path, "rb") as file:
+                header = file.read(HEADER.size)
+        except FileNotFoundError:
+            return None
+        if len(header) < HEADER.size:
+            return None
+        magic, version, key, width, height, room_count, spawn_count, door_count = HEADER.unpack(header)
+        if magic != MAGIC or version != FORMAT_VERSION or key != self.key(seed, level_config):
+            return None
+        # Mark it as used, for prune().
+        os.utime(path)
+
+        offset = HEADER.size
+        tiles = np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(height, width))
+        offset = _align(offset + width * height)
+        rooms = np.memmap(path, dtype=ROOM_DT, mode="r", offset=offset, shape=(room_count,)) \
+            if room_count else np.empty(0, dtype=ROOM_DT)
+        offset += room_count * ROOM_DT.itemsize
+        spawns = np.memmap(path, dtype=SPAWN_DT, mode="r", offset=offset, shape=(spawn_count, 2)) \
+            if spawn_count else np.empty((0, 2), dtype=SPAWN_DT)
+        offset += spawn_count * 2 * SPAWN_DT.itemsize
+        doors = np.memmap(path, dtype=DOOR_DT, mode="r", offset=offset, shape=(door_count,)) \
+            if door_count else np.empty(0, dtype=DOOR_DT)
+        return LevelData(tiles, rooms.view(np.recarray), spawns, seed, doors.view(np.recarray))
+
+    def save(self, seed: int, level_config, level: LevelData):
+        os.makedirs(self.directory, exist_ok=True)
+        height, width = level.tiles.shape
+        header = HEADER.pack(
+            MAGIC, FORMAT_VERSION, self.key(seed, level_config),
+            width, height, len(level.rooms), len(level.spawns), len(level.doors))
+
+        path = self.path(seed, level_config)
+        # Write next to the real file and swap it in, so a half written file
+        # is never picked up.
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(header)
+            file.write(np.ascontiguousarray(level.tiles, dtype=np.uint8).tobytes())
+            file.write(bytes(_align(file.tell()) - file.tell()))
+            file.write(np.asarray(level.rooms, dtype=ROOM_DT).tobytes())
+            file.write(np.asarray(level.spawns, dtype=SPAWN_DT).tobytes())
+            file.write(np.asarray(level.doors, dtype=DOOR_DT).tobytes())
+        os.replace(temp_path, path)
+        self.prune()
+
+    def prune(self):
+        """ Delete the least recently used levels past max_files """
+        paths = [entry.path for entry in os.scandir(self.directory) if entry.name.endswith(".map")]
+        if len(paths) <= self.max_files:
+            return
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:len(paths) - self.max_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                # Gone already, or still open on Windows; next time.
+                pass
+
+    def get_or_generate(self, seed: int, level_config=config) -> LevelData:
+        """ Load the level for this seed, generating (and caching) it if needed """
+        level = self.load(seed, level_config)
+        if level is None:
+            dg = RLDungeonGenerator(level_config, seed)
+            dg.generate_map()
+            level = dg.level_data()
+            self.save(seed, level_config, level)
+        return level
@@ -0,0 +1,259 @@
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import tile_types
+
+# A tile, as (row, column).
+Tile = Tuple[int, int]
+
+# Node ids for the ends of a route, while it's being searched for.
+START = -1
+GOAL = -2
+
+
+def manhattan(a: Tile, b: Tile) -> int:
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+def astar(walkable: np.ndarray, start: Tile, goal: Tile, bounds: Tuple[int, int, int, int] = None) -> Optional[List[Tile]]:
+    """
+    Shortest path of tiles (4-way, start and goal included) over a [row,
+    column] walkable grid, or None if there isn't one. bounds = (min_row,
+    min_col, max_row, max_col), inclusive, keeps the search inside a
+    rectangle.
+    """
+    height, width = walkable.shape
+    min_row, min_col, max_row, max_col = (0, 0, height - 1, width - 1) if bounds is None else bounds
+    min_row, min_col = max(min_row, 0), max(min_col, 0)
+    max_row, max_col = min(max_row, height - 1), min(max_col, width - 1)
+
+    came_from = {start: None}
+    costs = {start: 0}
+    queue = [(manhattan(start, goal), 0, start)]
+    while queue:
+        _, cost, tile = heapq.heappop(queue)
+        if tile == goal:
+            path = []
+            while tile is not None:
+                path.append(tile)
+                tile = came_from[tile]
+            return path[::-1]
+        if cost > costs[tile]:
+            continue
+        row, col = tile
+        for step in ((row + 1, col), (row - 1, col), (row, col + 1), (row, col - 1)):
+            if not (min_row <= step[0] <= max_row and min_col <= step[1] <= max_col) or not walkable[step]:
+                continue
+            if cost + 1 < costs.get(step, cost + 2):
+                costs[step] = cost + 1
+                came_from[step] = tile
+                heapq.heappush(queue, (cost + 1 + manhattan(step, goal), cost + 1, step))
+    return None
+
+
+class NavGraph:
+    """
+    A dungeon's rooms and corridors as a graph, for finding long paths
+    without searching every tile on the way (HPA*-style).
+
+    The nodes are the openings in the rooms' walls: the doors the generator
+    carved (see LevelData.doors), plus any wall a corridor cut through on
+    its way past another room. Where corridors cross, the crossing is a
+    node too. Doors link to the other doors of their room, as walking
+    across an empty room is just the Manhattan distance, and along their
+    corridor to the next node. route() searches that graph for the nodes
+    to go through; refine() turns one leg of the route into tiles with an
+    A* boxed in around the leg. Something following a route only needs to
+    refine the leg it's on.
+    """
+    def __init__(self, tiles: np.ndarray, rooms: np.recarray, doors: np.recarray):
+        tiles = np.asarray(tiles)
+        self.walkable = tile_types.tiles["walkable"][tiles]
+        self.rooms = rooms
+        # Which room each tile is in (walls included), -1 for none.
+        self.room_ids = np.full(tiles.shape, -1, dtype=np.int32)
+        edges = np.zeros(tiles.shape, dtype=bool)
+        for index, (row, col, height, width) in enumerate(rooms.tolist()):
+            if height > 0 and width > 0:
+                self.room_ids[row:row + height, col:col + width] = index
+                edges[row:row + height, col:col + width] = True
+                edges[row + 1:row + height - 1, col + 1:col + width - 1] = False
+        # Corridors are the walkable tiles outside every room.
+        corridor = self.walkable & (self.room_ids < 0)
+        # Corridor tiles where three or four ways meet.
+        ways = np.zeros(tiles.shape, dtype=np.int8)
+        open_tiles = corridor | (edges & self.walkable)
+        ways[1:] += open_tiles[:-1]
+        ways[:-1] += open_tiles[1:]
+        ways[:, 1:] += open_tiles[:, :-1]
+        ways[:, :-1] += open_tiles[:, 1:]
+
+        # Door and crossing tiles, and the room each one is in (-1 for crossings).
+        self.nodes: List[Tile] = []
+        self.node_ids: Dict[Tile, int] = {}
+        self.node_rooms: List[int] = []
+        # Cost to every linked node, by node.
+        self.links: List[Dict[int, int]] = []
+        openings = {(row_a, col_a) for _, row_a, col_a, _, _, _ in doors.tolist()}
+        openings |= {(row_b, col_b) for _, _, _, _, row_b, col_b in doors.tolist()}
+        openings |= set(map(tuple, np.argwhere((edges & self.walkable) | (corridor & (ways >= 3))).tolist()))
+        for tile in sorted(openings):
+            self.node_ids[tile] = len(self.nodes)
+            self.nodes.append(tile)
+            self.node_rooms.append(int(self.room_ids[tile]))
+            self.links.append({})
+
+        # Across each room, door to door, and between nodes side by side
+        # (rooms touching, rooms too thin to have a floor, crossings).
+        self.room_nodes: Dict[int, List[int]] = {}
+        for node, room in enumerate(self.node_rooms):
+            if room >= 0:
+                self.room_nodes.setdefault(room, []).append(node)
+        for room, members in self.room_nodes.items():
+            for i, a in enumerate(members):
+                for b in members[i + 1:]:
+                    cost = self.crossing_cost(room, self.nodes[a], self.nodes[b])
+                    if cost is not None:
+                        self.link(a, b, cost)
+        for node, (row, col) in enumerate(self.nodes):
+            for other in (self.node_ids.get((row + 1, col)), self.node_ids.get((row, col + 1))):
+                if other is not None:
+                    self.link(node, other, 1)
+
+        # Between the nodes, corridors are single file. Walk each one from
+        # its ends, noting where along it each tile is.
+        # (node, steps from it, node at the other end or None, steps to that)
+        self.corridor_tiles: Dict[Tile, Tuple[int, int, Optional[int], int]] = {}
+        for node, tile in enumerate(self.nodes):
+            for step in self.neighbours(tile):
+                if corridor[step] and step not in self.node_ids and step not in self.corridor_tiles:
+                    self.walk_corridor(node, step, corridor)
+
+    @classmethod
+    def from_level(cls, level) -> "NavGraph":
+        return cls(level.tiles, level.rooms, level.doors)
+
+    def neighbours(self, tile: Tile):
+        row, col = tile
+        height, width = self.walkable.shape
+        for step in ((row + 1, col), (row - 1, col), (row, col + 1), (row, col - 1)):
+            if 0 <= step[0] < height and 0 <= step[1] < width:
+                yield step
+
+    def walk_corridor(self, node: int, tile: Tile, corridor: np.ndarray):
+        """ Follow a corridor from a node's neighbouring tile to the next node (or a dead end) """
+        path = [tile]
+        previous, end = self.nodes[node], None
+        while True:
+            ahead = [step for step in self.neighbours(path[-1])
+                     if step != previous and (corridor[step] or step in self.node_ids)]
+            if not ahead:
+                break
+            previous = path[-1]
+            if ahead[0] in self.node_ids:
+                end = self.node_ids[ahead[0]]
+                break
+            path.append(ahead[0])
+        length = len(path) + 1
+        if end is not None and end != node:
+            self.link(node, end, length)
+        for i, tile in enumerate(path):
+            self.corridor_tiles[tile] = (node, i + 1, end, length - i - 1)
+
+    def link(self, a: int, b: int, cost: int):
+        if cost < self.links[a].get(b, cost + 1):
+            self.links[a][b] = self.links[b][a] = cost
+
+    def crossing_cost(self, room: int, a: Tile, b: Tile) -> Optional[int]:
+        """ Steps from one door of a room to another, None if the room has no floor """
+        row, col, height, width = self.rooms[room].tolist()
+        if height < 3 or width < 3:
+            return None
+        cost = manhattan(a, b)
+        # Doors in the same wall have to step in and back out again.
+        if (a[0] == b[0] and a[0] in (row, row + height - 1)) or (a[1] == b[1] and a[1] in (col, col + width - 1)):
+            cost += 2
+        return cost
+
+    def exits(self, tile: Tile) -> Optional[Dict[int, int]]:
+        """ Nodes reachable straight from a tile, with their costs; None if it's nowhere on the graph """
+        if not self.walkable[tile]:
+            return None
+        node = self.node_ids.get(tile)
+        if node is not None:
+            return {node: 0}
+        along = self.corridor_tiles.get(tile)
+        if along is not None:
+            start, to_start, end, to_end = along
+            return {start: to_start} if end is None else {start: to_start, end: to_end}
+        return {node: manhattan(tile, self.nodes[node]) for node in self.room_nodes.get(self.room_ids[tile], ())}
+
+    def same_area(self, start: Tile, goal: Tile) -> bool:
+        """ Whether one tile can walk straight to the other, without the graph """
+        along = self.corridor_tiles.get(start)
+        if along is not None:
+            other = self.corridor_tiles.get(goal)
+            return other is not None and {along[0], along[2]} == {other[0], other[2]}
+        room = self.room_ids[start]
+        return room >= 0 and room == self.room_ids[goal] \
+            and start not in self.node_ids and goal not in self.node_ids
+
+    def route(self, start: Tile, goal: Tile) -> Optional[List[Tile]]:
+        """
+        The tiles to head for, one after the other, to get from start to
+        goal: start, the doors on the way, then goal. None if there's no way.
+        """
+        start, goal = tuple(start), tuple(goal)
+        if start == goal or self.same_area(start, goal):
+            return [start, goal]
+        exits, entries = self.exits(start), self.exits(goal)
+        if not exits or not entries:
+            return None
+
+        def position(node):
+            return start if node == START else goal if node == GOAL else self.nodes[node]
+
+        came_from = {START: None}
+        costs = {START: 0}
+        queue = [(manhattan(start, goal), 0, START)]
+        while queue:
+            _, cost, node = heapq.heappop(queue)
+            if node == GOAL:
+                route = []
+                while node is not None:
+                    route.append(position(node))
+                    node = came_from[node]
+                return route[::-1]
+            if cost > costs[node]:
+                continue
+            links = exits if node == START else self.links[node]
+            if node in entries:
+                links = {**links, GOAL: entries[node]}
+            for other, step in links.items():
+                if cost + step < costs.get(other, cost + step + 1):
+                    costs[other] = cost + step
+                    came_from[other] = node
+                    heapq.heappush(queue, (cost + step + manhattan(position(other), goal), cost + step, other))
+        return None
+
+    def refine(self, start: Tile, goal: Tile) -> Optional[List[Tile]]:
+        """ Tiles from one point of a route to the next, searching only around the two """
+        start, goal = tuple(start), tuple(goal)
+        bounds = (min(start[0], goal[0]) - 1, min(start[1], goal[1]) - 1,
+                  max(start[0], goal[0]) + 1, max(start[1], goal[1]) + 1)
+        return astar(self.walkable, start, goal, bounds) or astar(self.walkable, start, goal)
+
+    def path(self, start: Tile, goal: Tile) -> Optional[List[Tile]]:
+        """ Every tile from start to goal, refining the whole route at once """
+        route = self.route(start, goal)
+        if route is None:
+            return None
+        path = [route[0]]
+        for a, b in zip(route, route[1:]):
+            leg = self.refine(a, b)
+            if leg is None:
+                return None
+            path.extend(leg[1:])
+        return path
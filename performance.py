@@ -1,50 +1,205 @@
-import time
 import collections
+import contextlib
+import math
+import time
 import timeit
 
-'''
-Possible improvements:
- - draw the sprite count.
- - package more of the code in main game.py so it's just a 
-    call to a method in this class (looks cleaner in the main game.py).
- - nicer console output or draw nicely to screen.
- '''
+from config import config
+from telemetry import telemetry
+
+
+class RollingStats:
+    """
+    Statistics over the last `size` values, in fixed memory. Adding a value
+    is O(1) (amortised): the sum is kept incrementally and min/max come from
+    monotonic queues. Percentiles sort the window, so only work them out
+    when they're read, not every frame.
+    """
+    def __init__(self, size: int = 120):
+        self.size = size
+        self.values = [0.0] * size
+        self.count = 0
+        # Where the next value goes in the ring buffer.
+        self.index = 0
+        self.total = 0.0
+        self.last = 0.0
+        # Values added so far, to know when an entry falls out of the window.
+        self.added = 0
+        # (added, value) pairs, ascending (for min) and descending (for max).
+        self._min = collections.deque()
+        self._max = collections.deque()
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value: float):
+        if self.count == self.size:
+            self.total -= self.values[self.index]
+        else:
+            self.count += 1
+        self.values[self.index] = value
+        self.total += value
+        self.last = value
+        self.index = (self.index + 1) % self.size
+        if self.index == 0:
+            # Start each lap from a fresh sum, so rounding errors don't build up.
+            self.total = sum(self.values[:self.count])
+
+        self.added += 1
+        oldest = self.added - self.size
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((self.added, value))
+        while self._min[0][0] <= oldest:
+            self._min.popleft()
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((self.added, value))
+        while self._max[0][0] <= oldest:
+            self._max.popleft()
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def min(self) -> float:
+        return self._min[0][1] if self._min else 0.0
+
+    @property
+    def max(self) -> float:
+        return self._max[0][1] if self._max else 0.0
+
+    def percentiles(self, *percents: float) -> list:
+        """ Nearest-rank percentiles of the window, e.g. percentiles(50, 95, 99) """
+        if not self.count:
+            return [0.0] * len(percents)
+        window = sorted(self.values[:self.count])
+        return [window[min(self.count - 1, max(0, math.ceil(self.count * percent / 100) - 1))] for percent in percents]
+
+    def summary(self) -> dict:
+        p50, p95, p99 = self.percentiles(50, 95, 99)
+        return {"mean": self.mean, "min": self.min, "max": self.max, "p50": p50, "p95": p95, "p99": p99}
+
+
+class TimingScope:
+    """ One named phase, timed each time it's entered """
+    def __init__(self, profiler, name: str, parent=None):
+        self.profiler = profiler
+        self.name = name
+        self.parent = parent
+        self.path = f"{parent.path}/{name}" if parent is not None and parent.path else name
+        self.children = {}
+        self.stats = RollingStats(profiler.window)
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.profiler.current = self
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats.add(time.perf_counter() - self.start)
+        self.profiler.current = self.parent
+        return False
+
+
+class Profiler:
+    """
+    Nestable timing scopes for the hot path:
+
+        with profiler.scope("update"):
+            with profiler.scope("physics"):
+                ...
+
+    times "update" and "update/physics" over the last `window` frames.
+    While disabled, scope() hands back one shared do-nothing context, so the
+    cost is a method call and a flag check. Scopes are made once per path
+    and reused; a scope can't be nested inside itself.
+    """
+    def __init__(self, enabled: bool = False, window: int = 120):
+        self.enabled = enabled
+        self.window = window
+        self.root = TimingScope(self, "")
+        self.current = self.root
+        self.null_scope = contextlib.nullcontext()
+
+    def scope(self, name: str):
+        if not self.enabled:
+            return self.null_scope
+        scope = self.current.children.get(name)
+        if scope is None:
+            scope = self.current.children[name] = TimingScope(self, name, self.current)
+        return scope
+
+    def scopes(self) -> list:
+        """ Every scope that's been entered, parents before their children """
+        found = []
+        stack = list(reversed(self.root.children.values()))
+        while stack:
+            scope = stack.pop()
+            found.append(scope)
+            stack.extend(reversed(scope.children.values()))
+        return found
+
+    def get_timings(self) -> dict:
+        """ Rolling stats (seconds) for each scope, by path """
+        return {scope.path: scope.stats.summary() for scope in self.scopes()}
+
+    def get_last(self) -> dict:
+        """ Each scope's time (seconds) the last time it was entered """
+        return {scope.path: scope.stats.last for scope in self.scopes()}
+
+
+# Shared by the game and the simulation. Only times anything while the
+# performance stats or telemetry are on.
+profiler = Profiler(config.SHOW_PERFORMANCE or config.TELEMETRY_TARGET is not None)
+
 
 # --- FPSCounter class is used to get game performance stats ---
 class FPSCounter:
+    # Frames the rolling stats are over.
+    WINDOW = 120
+    # Readings kept in the history lists (one every couple of seconds).
+    HISTORY = 600
+
     def __init__(self):
         self.time = time.perf_counter()
-        self.frame_times = collections.deque(maxlen=60)
+        self.frame_times = RollingStats(self.WINDOW)
+        self.processing_times = RollingStats(self.WINDOW)
+        self.draw_times = RollingStats(self.WINDOW)
+        self.sprite_counts = RollingStats(self.WINDOW)
         self.total_program_time = 0
         self.processing_time = 0
         self.start_time = 0
         self.draw_start_time = 0
         self.draw_time = 0
         self.program_start_time = timeit.default_timer()
-        self.sprite_count_list = []
-        self.fps_list = []
-        self.processing_time_list = []
-        self.drawing_time_list = []
+        self.sprite_count_list = collections.deque(maxlen=self.HISTORY)
+        self.fps_list = collections.deque(maxlen=self.HISTORY)
+        self.processing_time_list = collections.deque(maxlen=self.HISTORY)
+        self.drawing_time_list = collections.deque(maxlen=self.HISTORY)
         self.last_fps_reading = 0
 
     def tick(self):
         t1 = time.perf_counter()
         dt = t1 - self.time
         self.time = t1
-        self.frame_times.append(dt)
+        self.frame_times.add(dt)
 
     def get_fps(self):
-        total_time = sum(self.frame_times)
-        if total_time == 0:
+        total_time = self.frame_times.total
+        if total_time <= 0:
             return 0
         else:
-            return len(self.frame_times) / sum(self.frame_times)
+            return len(self.frame_times) / total_time
     
     def get_default_timer(self):
         return timeit.default_timer()
     
     def set_processing_time(self):
         self.processing_time = self.get_default_timer() - self.start_time
+        self.processing_times.add(self.processing_time)
 
     def set_start_time(self):
         self.start_time = self.get_default_timer()
@@ -54,9 +209,27 @@ class FPSCounter:
     
     def set_draw_time(self):
         self.draw_time = self.get_default_timer() - self.draw_start_time
+        self.draw_times.add(self.draw_time)
     
     def set_draw_start_time(self):
         self.draw_start_time = self.get_default_timer()
+
+    def set_sprite_count(self, count: int):
+        self.sprite_counts.add(count)
+
+    def record_frame(self, **extra):
+        """ Send this frame's timings (seconds), plus anything in extra, to telemetry """
+        if telemetry is None:
+            return
+        telemetry.record({
+            "time": time.time(),
+            "frame": self.frame_times.last,
+            "processing": self.processing_time,
+            "drawing": self.draw_time,
+            "sprites": self.sprite_counts.last,
+            "phases": profiler.get_last(),
+            **extra,
+        })
     
     def get_total_program_time(self):
         return self.total_program_time
@@ -66,11 +239,20 @@ class FPSCounter:
     
     def set_last_reading(self):
         self.last_fps_reading = self.total_program_time
-    
-    def get_timings(self):
-        print(f"Running: {self.total_program_time}s \t| FPS: {self.get_fps():.1f} \t| Processing: {self.processing_time:.4f}s \t| Drawing: {self.draw_time:.4f}s")
+
+    def get_stats(self) -> dict:
+        """ Rolling frame, update and draw time stats (seconds) and sprite counts """
+        return {
+            "fps": self.get_fps(),
+            "frame": self.frame_times.summary(),
+            "processing": self.processing_times.summary(),
+            "drawing": self.draw_times.summary(),
+            "sprites": self.sprite_counts.summary(),
+            "phases": profiler.get_timings(),
+        }
     
     def update(self):
         self.fps_list.append(round(self.get_fps(), 1))
         self.processing_time_list.append(self.processing_time)
-        self.drawing_time_list.append(self.draw_time)
\ No newline at end of file
+        self.drawing_time_list.append(self.draw_time)
+        self.sprite_count_list.append(self.sprite_counts.last)
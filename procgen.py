@@ -1,182 +1,318 @@
 from __future__ import annotations
 
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from typing import TYPE_CHECKING, Tuple
 import random
-import math
 
 import arcade
+import numpy as np
 
+from config import config
+from hitbox_cache import hit_box_cache
 from entities import BaseEntity, Tree
+from tile_layer import TileLayer
+import tile_types
+
+
+# A room is a record in a numpy record array, so the rooms of a level can be
+# compared against each other as whole columns (rooms.row, rooms.width, ...).
+room_dt = np.dtype(
+    [
+        ("row", np.int32),
+        ("col", np.int32),
+        ("height", np.int32),
+        ("width", np.int32),
+    ]
+)
+
+
+# Each corridor joins two rooms, through a door in each room's wall. Records
+# are (room, door row, door column) for both ends.
+door_dt = np.dtype(
+    [
+        ("room_a", np.int32),
+        ("row_a", np.int32),
+        ("col_a", np.int32),
+        ("room_b", np.int32),
+        ("row_b", np.int32),
+        ("col_b", np.int32),
+    ]
+)
+
+
+def rng_stream(seed, name: str) -> random.Random:
+    """
+    A random stream for one part of the generator. Streams with different
+    names don't affect each other, so changing how one part uses random
+    numbers leaves the others' output alone.
+    """
+    return random.Random(f"{seed}:{name}")
+
+
+def new_rooms(rooms=()) -> np.recarray:
+    """ Pack (row, col, height, width) tuples into a room record array """
+    return np.array(list(rooms), dtype=room_dt).view(np.recarray)
+
+
+def new_doors(doors=()) -> np.recarray:
+    """ Pack (room_a, row_a, col_a, room_b, row_b, col_b) tuples into a door record array """
+    return np.array(list(doors), dtype=door_dt).view(np.recarray)
+
+
+def split_section(section, max_size, seed) -> np.ndarray:
+    """
+    Binary space partition of section = (min_row, min_col, max_row, max_col)
+    until no side is max_size or more. Sections wait on an explicit work queue
+    instead of the call stack, and every random choice comes from a stream
+    seeded with `seed`, so a subtree splits the same way wherever it runs.
+
+    Returns the leaf table: one (min_row, min_col, max_row, max_col) row per leaf.
+    """
+    rng = random.Random(seed)
+    # Each split takes at least max_size // 2 - 3 off a side, which bounds the
+    # number of leaves. The table still grows if tiny sections beat the estimate.
+    min_side = max(1, max_size // 2 - 3)
+    capacity = ((section[2] - section[0]) // min_side + 1) * ((section[3] - section[1]) // min_side + 1)
+    leaves = np.empty((capacity, 4), dtype=np.int32)
+    leaf_count = 0
+
+    # Right-hand halves are pushed first, so leaves come out in the same
+    # order (and use the same random numbers) as a depth-first recursion.
+    queue = [tuple(section)]
+    while queue:
+        min_row, min_col, max_row, max_col = queue.pop()
+        seg_height = max_row - min_row
+        seg_width = max_col - min_col
 
+        if seg_height < max_size and seg_width < max_size:
+            if leaf_count == len(leaves):
+                leaves = np.resize(leaves, (2 * len(leaves), 4))
+            leaves[leaf_count] = (min_row, min_col, max_row, max_col)
+            leaf_count += 1
+            continue
+
+        if seg_height < max_size <= seg_width:
+            horizontal = False
+        elif seg_height >= max_size > seg_width:
+            horizontal = True
+        else:
+            horizontal = rng.random() < 0.5
 
-class Room:
-    """ A room """
-    def __init__(self, r, c, h, w):
-        self.row = r
-        self.col = c
-        self.height = h
-        self.width = w
+        if horizontal:
+            split = (min_row + max_row) // 2 + rng.choice((-2, -1, 0, 1, 2))
+            queue.append((split + 1, min_col, max_row, max_col))
+            queue.append((min_row, min_col, split, max_col))
+        else:
+            split = (min_col + max_col) // 2 + rng.choice((-2, -1, 0, 1, 2))
+            queue.append((min_row, split + 1, max_row, max_col))
+            queue.append((min_row, min_col, max_row, split))
+
+    return leaves[:leaf_count]
+
+
+class LevelData:
+    """ A generated level as a few compact arrays, cheap to pass between processes """
+    def __init__(self, tiles: np.ndarray, rooms: np.recarray, spawns: np.ndarray, seed: int = None,
+                 doors: np.recarray = None):
+        # Seed the level was generated from
+        self.seed = seed
+        # (height, width) uint8 tile ids
+        self.tiles = tiles
+        # One record per room (row, col, height, width)
+        self.rooms = rooms
+        # (n, 2) floor cells (row, col) where the player or monsters can start
+        self.spawns = spawns
+        # One record per corridor, with the rooms and doors at each end (see navigation.py)
+        self.doors = new_doors() if doors is None else doors
+
+
+class DisjointSet:
+    """ Union-find over room indices, tracking which rooms are already connected """
+    def __init__(self, size):
+        self.parent = list(range(size))
+        self.rank = [0] * size
+
+    def find(self, item):
+        # Path halving keeps the trees flat.
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a, b) -> bool:
+        """ Join the sets holding a and b. Returns False if they were already joined. """
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return False
+        if self.rank[a] < self.rank[b]:
+            a, b = b, a
+        self.parent[b] = a
+        if self.rank[a] == self.rank[b]:
+            self.rank[a] += 1
+        return True
 
 
 class RLDungeonGenerator:
     """ Generate the dungeon """
-    def __init__(self, config):
-        """ Create the board """
+    def __init__(self, config, seed: int = None):
+        """ Create the board. The same seed and config always give the same map. """
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.split_rng = rng_stream(self.seed, "split")
+        self.room_rng = rng_stream(self.seed, "rooms")
+        self.corridor_rng = rng_stream(self.seed, "corridors")
+        self.spawn_rng = rng_stream(self.seed, "spawns")
         self.MAX = 15  # Cutoff for when we want to stop dividing sections
+        # Sections bigger than this are first cut into subtrees, each split
+        # with its own random stream (and worker process, if BSP_WORKERS > 1).
+        self.SUBTREE_SIZE = config.BSP_SUBTREE_SIZE
+        self.workers = config.BSP_WORKERS
         self.width = config.GRID_WIDTH
         self.height = config.GRID_HEIGHT
-        self.leaves = []
-        self.dungeon = []
-        self.rooms = []
-        self.WALL_SPRITE_SCALING = config.WALL_SPRITE_SCALING
-        self.WALL_SPRITE_SIZE = config.WALL_SPRITE_SIZE
+        self.leaves = np.empty((0, 4), dtype=np.int32)
+        self.rooms = new_rooms()
+        # (room_a, row_a, col_a, room_b, row_b, col_b) of each corridor carved
+        self.doors = []
+        self.WALL_SPRITE_SCALING = config.SPRITE_SCALING
+        self.WALL_SPRITE_SIZE = config.TILE_SIZE
         self.AREA_WIDTH = config.AREA_WIDTH
         self.AREA_HEIGHT = config.AREA_HEIGHT
+        self.connect_strategy = config.DUNGEON_CONNECT_STRATEGY
+        self.extra_loops = config.DUNGEON_EXTRA_LOOPS
 
-        for h in range(self.height):
-            row = []
-            for w in range(self.width):
-                row.append('#')
+        # One byte per cell, each holding a tile id from tile_types.
+        self.dungeon = np.full((self.height, self.width), tile_types.ROCK, dtype=np.uint8)
 
-            self.dungeon.append(row)
+    def __str__(self):
+        """ Text version of the map, for debugging. Top row is printed first. """
+        names = tile_types.tile_names[self.dungeon[::-1]]
+        return "\n".join("".join(f"{name:2}" for name in row) for row in names)
 
     def random_split(self, min_row, min_col, max_row, max_col):
-        # We want to keep splitting until the sections get down to the threshold
-        seg_height = max_row - min_row
-        seg_width = max_col - min_col
-
-        if seg_height < self.MAX and seg_width < self.MAX:
-            self.leaves.append((min_row, min_col, max_row, max_col))
-        elif seg_height < self.MAX <= seg_width:
-            self.split_on_vertical(min_row, min_col, max_row, max_col)
-        elif seg_height >= self.MAX > seg_width:
-            self.split_on_horizontal(min_row, min_col, max_row, max_col)
+        """ Split the section into leaves, filling in the self.leaves table """
+        # We want to keep splitting until the sections get down to the threshold.
+        # Big maps are first cut into subtrees which can be split independently.
+        subtrees = split_section(
+            (min_row, min_col, max_row, max_col),
+            max(self.SUBTREE_SIZE, self.MAX),
+            self.split_rng.getrandbits(64))
+        seeds = [self.split_rng.getrandbits(64) for _ in range(len(subtrees))]
+
+        if self.workers > 1 and len(subtrees) > 1:
+            with ProcessPoolExecutor(self.workers) as pool:
+                tables = list(pool.map(split_section, subtrees.tolist(), repeat(self.MAX), seeds))
         else:
-            if random.random() < 0.5:
-                self.split_on_horizontal(min_row, min_col, max_row, max_col)
-            else:
-                self.split_on_vertical(min_row, min_col, max_row, max_col)
+            tables = [split_section(subtree, self.MAX, seed) for subtree, seed in zip(subtrees.tolist(), seeds)]
 
-    def split_on_horizontal(self, min_row, min_col, max_row, max_col):
-        split = (min_row + max_row) // 2 + random.choice((-2, -1, 0, 1, 2))
-        self.random_split(min_row, min_col, split, max_col)
-        self.random_split(split + 1, min_col, max_row, max_col)
-
-    def split_on_vertical(self, min_row, min_col, max_row, max_col):
-        split = (min_col + max_col) // 2 + random.choice((-2, -1, 0, 1, 2))
-        self.random_split(min_row, min_col, max_row, split)
-        self.random_split(min_row, split + 1, max_row, max_col)
+        self.leaves = np.concatenate(tables)
 
     def carve_rooms(self):
-        for leaf in self.leaves:
+        rooms = []
+        for leaf in self.leaves.tolist():
             # We don't want to fill in every possible room or the
             # dungeon looks too uniform
-            if random.random() > 0.80:
+            if self.room_rng.random() > 0.80:
                 continue
             section_width = leaf[3] - leaf[1]
             section_height = leaf[2] - leaf[0]
 
             # The actual room's height and width will be 60-100% of the
             # available section.
-            room_width = round(random.randrange(60, 100) / 100 * section_width)
-            room_height = round(random.randrange(60, 100) / 100 * section_height)
+            room_width = round(self.room_rng.randrange(60, 100) / 100 * section_width)
+            room_height = round(self.room_rng.randrange(60, 100) / 100 * section_height)
 
             # If the room doesn't occupy the entire section we are carving it from,
             # 'jiggle' it a bit in the square
             if section_height > room_height:
-                room_start_row = leaf[0] + random.randrange(section_height - room_height)
+                room_start_row = leaf[0] + self.room_rng.randrange(section_height - room_height)
             else:
                 room_start_row = leaf[0]
 
             if section_width > room_width:
-                room_start_col = leaf[1] + random.randrange(section_width - room_width)
+                room_start_col = leaf[1] + self.room_rng.randrange(section_width - room_width)
             else:
                 room_start_col = leaf[1]
 
-            self.rooms.append(Room(room_start_row, room_start_col, room_height, room_width))
-            for r in range(room_start_row, room_start_row + room_height):
-                for c in range(room_start_col, room_start_col + room_width):
-                    # Select the correct wall or floor for different parts of the room.
-                    if r == room_start_row:
-                        if c == room_start_col:
-                            self.dungeon[r][c] = 'sw'
-                        elif c == room_start_col + room_width - 1:
-                            self.dungeon[r][c] = 'se'
-                        else:
-                            self.dungeon[r][c] = 'hr'
-                    elif r == room_start_row + room_height - 1:
-                        if c == room_start_col:
-                            self.dungeon[r][c] = 'nw'
-                        elif c == room_start_col + room_width - 1:
-                            self.dungeon[r][c] = 'ne'
-                        else:
-                            self.dungeon[r][c] = 'hr'
-                    else:
-                        if c == room_start_col or c == room_start_col + room_width - 1:
-                            self.dungeon[r][c] = 'vr'
-                        else:
-                            self.dungeon[r][c] = '.'
-
-    @staticmethod
-    def are_rooms_adjacent(room1, room2):
-        """ See if two rooms are next to each other. """
-        adj_rows = []
-        adj_cols = []
-        for r in range(room1.row, room1.row + room1.height):
-            if room2.row <= r < room2.row + room2.height:
-                adj_rows.append(r)
-
-        for c in range(room1.col, room1.col + room1.width):
-            if room2.col <= c < room2.col + room2.width:
-                adj_cols.append(c)
-
-        return adj_rows, adj_cols
+            rooms.append((room_start_row, room_start_col, room_height, room_width))
+            room = self.dungeon[room_start_row:room_start_row + room_height,
+                                room_start_col:room_start_col + room_width]
+            if room.size == 0:
+                continue
+            # Select the correct wall or floor for different parts of the room.
+            # Later writes win, so corners are written after the edges.
+            room[:, :] = tile_types.FLOOR
+            room[:, -1] = tile_types.WALL_VR
+            room[:, 0] = tile_types.WALL_VR
+            room[-1, :] = tile_types.WALL_HR
+            room[-1, -1] = tile_types.WALL_NE
+            room[-1, 0] = tile_types.WALL_NW
+            room[0, :] = tile_types.WALL_HR
+            room[0, -1] = tile_types.WALL_SE
+            room[0, 0] = tile_types.WALL_SW
+
+        self.rooms = new_rooms(rooms)
 
     @staticmethod
-    def distance_between_rooms(room1, room2):
-        """ Get the distance between two rooms """
-        centre1 = (room1.row + room1.height // 2, room1.col + room1.width // 2)
-        centre2 = (room2.row + room2.height // 2, room2.col + room2.width // 2)
-
-        return math.sqrt((centre1[0] - centre2[0]) ** 2 + (centre1[1] - centre2[1]) ** 2)
-
-    def carve_corridor_between_rooms(self, room1, room2):
-        """ Make a corridor between rooms """
-        if room2[2] == 'rows':
-            row = random.choice(room2[1])
+    def room_adjacency(rooms):
+        """
+        Compare every pair of rooms at once. For each pair get the rows and
+        the columns inside both rooms' walls, as [lo, hi) intervals (empty
+        when hi <= lo), and the distance between the room centres.
+        """
+        # Skip the walls, so a corridor never runs along the edge of a room.
+        top = rooms.row + rooms.height - 1
+        right = rooms.col + rooms.width - 1
+        row_lo = np.maximum.outer(rooms.row + 1, rooms.row + 1)
+        row_hi = np.minimum.outer(top, top)
+        col_lo = np.maximum.outer(rooms.col + 1, rooms.col + 1)
+        col_hi = np.minimum.outer(right, right)
+
+        centre_row = rooms.row + rooms.height // 2
+        centre_col = rooms.col + rooms.width // 2
+        distance = np.hypot(
+            np.subtract.outer(centre_row, centre_row),
+            np.subtract.outer(centre_col, centre_col),
+        )
+        return row_lo, row_hi, col_lo, col_hi, distance
+
+    def carve_corridor_between_rooms(self, first, second, shared, axis):
+        """
+        Make a corridor between rooms (by index). `shared` holds the rows (or
+        columns, depending on `axis`) inside both rooms; the corridor runs
+        along one of them, with a door where it goes through each room's
+        wall. The doors are recorded in self.doors.
+        """
+        room1, room2 = self.rooms[first], self.rooms[second]
+        if axis == 'rows':
+            row = self.corridor_rng.choice(shared)
             # Figure out which room is to the left of the other
-            if room1.col + room1.width < room2[0].col:
-                start_col = room1.col + room1.width
-                end_col = room2[0].col
+            if room1.col < room2.col:
+                start, end = first, second
+                start_col = room1.col + room1.width - 1
+                end_col = room2.col
             else:
-                start_col = room2[0].col + room2[0].width
+                start, end = second, first
+                start_col = room2.col + room2.width - 1
                 end_col = room1.col
-            for c in range(start_col, end_col):
-                self.dungeon[row][c] = '.'
-
-            if end_col - start_col >= 4:
-                self.dungeon[row][start_col] = '+'
-                self.dungeon[row][end_col - 1] = '+'
-            elif start_col == end_col - 1:
-                self.dungeon[row][start_col] = '+'
+            self.dungeon[row, start_col + 1:end_col] = tile_types.FLOOR
+            self.dungeon[row, [start_col, end_col]] = tile_types.DOOR
+            self.doors.append((start, row, start_col, end, row, end_col))
         else:
-            col = random.choice(room2[1])
+            col = self.corridor_rng.choice(shared)
             # Figure out which room is above the other
-            if room1.row + room1.height < room2[0].row:
-                start_row = room1.row + room1.height
-                end_row = room2[0].row
+            if room1.row < room2.row:
+                start, end = first, second
+                start_row = room1.row + room1.height - 1
+                end_row = room2.row
             else:
-                start_row = room2[0].row + room2[0].height
+                start, end = second, first
+                start_row = room2.row + room2.height - 1
                 end_row = room1.row
-
-            for r in range(start_row, end_row):
-                self.dungeon[r][col] = '.'
-
-            if end_row - start_row >= 4:
-                self.dungeon[start_row][col] = '+'
-                self.dungeon[end_row - 1][col] = '+'
-            elif start_row == end_row - 1:
-                self.dungeon[start_row][col] = '+'
+            self.dungeon[start_row + 1:end_row, col] = tile_types.FLOOR
+            self.dungeon[[start_row, end_row], col] = tile_types.DOOR
+            self.doors.append((start, start_row, col, end, end_row, col))
 
     def find_closest_unconnect_groups(self, groups, room_dict):
         """
@@ -191,15 +327,14 @@ class RLDungeonGenerator:
 
         for group in groups:
             for room in group:
-                key = (room.row, room.col)
-                for other in room_dict[key]:
+                for other in room_dict[room]:
                     if not other[0] in group and other[3] < shortest_distance:
                         shortest_distance = other[3]
                         start = room
                         nearest = other
                         start_group = group
 
-        self.carve_corridor_between_rooms(start, nearest)
+        self.carve_corridor_between_rooms(start, nearest[0], nearest[1], nearest[2])
 
         # Merge the groups
         other_group = None
@@ -213,90 +348,126 @@ class RLDungeonGenerator:
 
     def connect_rooms(self):
         """
-        Build a dictionary containing an entry for each room. Each bucket will
-        hold a list of the adjacent rooms, weather they are adjacent along rows or
-        columns and the distance between them.
+        Build a dictionary containing an entry for each room (by index). Each
+        bucket will hold a list of the adjacent rooms, the rows or columns they
+        share, weather they are adjacent along rows or columns and the distance
+        between them.
 
         Also build the initial groups (which start of as a list of individual rooms)
         """
-        groups = []
-        room_dict = {}
-        for room in self.rooms:
-            key = (room.row, room.col)
-            room_dict[key] = []
-            for other in self.rooms:
-                other_key = (other.row, other.col)
-                if key == other_key:
-                    continue
-                adj = self.are_rooms_adjacent(room, other)
-                if len(adj[0]) > 0:
-                    room_dict[key].append((other, adj[0], 'rows', self.distance_between_rooms(room, other)))
-                elif len(adj[1]) > 0:
-                    room_dict[key].append((other, adj[1], 'cols', self.distance_between_rooms(room, other)))
-
-            groups.append([room])
+        row_lo, row_hi, col_lo, col_hi, distance = self.room_adjacency(self.rooms)
+        # Sharing rows wins over sharing columns, and a room is never
+        # adjacent to itself.
+        rows_adjacent = row_hi > row_lo
+        adjacent = rows_adjacent | (col_hi > col_lo)
+        np.fill_diagonal(adjacent, False)
+
+        groups = [[room] for room in range(len(self.rooms))]
+        room_dict = {room: [] for room in range(len(self.rooms))}
+        for room, other in zip(*np.nonzero(adjacent)):
+            if rows_adjacent[room, other]:
+                shared = range(row_lo[room, other], row_hi[room, other])
+                axis = 'rows'
+            else:
+                shared = range(col_lo[room, other], col_hi[room, other])
+                axis = 'cols'
+            room_dict[room].append((other, shared, axis, distance[room, other]))
 
         while len(groups) > 1:
             self.find_closest_unconnect_groups(groups, room_dict)
 
+    def connect_rooms_mst(self, extra_loops=0.0):
+        """
+        Join the rooms along a minimum spanning tree of the possible corridors
+        (Kruskal's algorithm). Always joining the closest pair of rooms that
+        aren't connected yet gives the same kind of layout as connect_rooms,
+        without rescanning every group on each merge.
+
+        extra_loops adds that fraction of the tree's corridor count again as
+        randomly picked spare corridors, so the dungeon isn't a pure tree.
+        """
+        row_lo, row_hi, col_lo, col_hi, distance = self.room_adjacency(self.rooms)
+        rows_adjacent = row_hi > row_lo
+        adjacent = rows_adjacent | (col_hi > col_lo)
+        # Only look at each pair once.
+        rooms_a, rooms_b = np.nonzero(np.triu(adjacent, k=1))
+        order = np.argsort(distance[rooms_a, rooms_b], kind="stable")
+
+        def carve(edge):
+            room, other = rooms_a[edge], rooms_b[edge]
+            if rows_adjacent[room, other]:
+                shared = range(row_lo[room, other], row_hi[room, other])
+                axis = 'rows'
+            else:
+                shared = range(col_lo[room, other], col_hi[room, other])
+                axis = 'cols'
+            self.carve_corridor_between_rooms(room, other, shared, axis)
+
+        connected = DisjointSet(len(self.rooms))
+        tree_size = 0
+        spare = []
+        for edge in order:
+            if connected.union(rooms_a[edge], rooms_b[edge]):
+                carve(edge)
+                tree_size += 1
+            else:
+                spare.append(edge)
+
+        loop_count = min(len(spare), round(tree_size * extra_loops))
+        for edge in self.corridor_rng.sample(spare, loop_count):
+            carve(edge)
+
     def generate_map(self):
         """ Make the map """
         self.random_split(1, 1, self.height - 1, self.width - 1)
         self.carve_rooms()
-        self.connect_rooms()
+        if self.connect_strategy == "mst":
+            self.connect_rooms_mst(self.extra_loops)
+        else:
+            self.connect_rooms()
+
+    def spawn_points(self) -> np.ndarray:
+        """ The centre of each room big enough to have a floor, in random order """
+        rooms = self.rooms[(self.rooms.height >= 3) & (self.rooms.width >= 3)]
+        spawns = np.stack([rooms.row + rooms.height // 2, rooms.col + rooms.width // 2], axis=1)
+        order = list(range(len(spawns)))
+        self.spawn_rng.shuffle(order)
+        return spawns[order].astype(np.int32)
+
+    def level_data(self) -> LevelData:
+        return LevelData(self.dungeon, self.rooms, self.spawn_points(), self.seed, new_doors(self.doors))
 
     def build_map(self):
-        """ Add wall, door, etc. sprites to the generated map """
+        """
+        Add wall, door, etc. sprites to the generated map. Only needed for
+        sprite collisions; use build_tile_layer to draw the map.
+        """
         wall_list = arcade.SpriteList(use_spatial_hash=True)
-        for row in range(self.height):
-            for column in range(self.width):
-                value = self.dungeon[row][column]
-                if value == '#':
-                    wall = arcade.Sprite("assets/gfx/tile_0011.png", self.WALL_SPRITE_SCALING)
-                    wall.center_x = column * self.WALL_SPRITE_SIZE + self.WALL_SPRITE_SIZE / 2
-                    wall.center_y = row * self.WALL_SPRITE_SIZE + self.WALL_SPRITE_SIZE / 2
-                    wall_list.append(wall)
-                elif value == 'nw':
-                    wall = arcade.Sprite("assets/gfx/tile_0090.png", self.WALL_SPRITE_SCALING)
-                    wall.center_x = column * self.WALL_SPRITE_SIZE + self.WALL_SPRITE_SIZE / 2
-                    wall.center_y = row * self.WALL_SPRITE_SIZE + self.WALL_SPRITE_SIZE / 2
-                    wall_list.append(wall)
-                elif value == 'ne':
-                    wall = arcade.Sprite("assets/gfx/tile_0093.png", self.WALL_SPRITE_SCALING)
-                    wall.center_x = column * self.WALL_SPRITE_SIZE + self.WALL_SPRITE_SIZE / 2
-                    wall.center_y = row * self.WALL_SPRITE_SIZE + self.WALL_SPRITE_SIZE / 2
-                    wall_list.append(wall)
-                elif value == 'sw':
-                    wall = arcade.Sprite("assets/gfx/tile_0096.png", self.WALL_SPRITE_SCALING)
-                    wall.center_x = column * self.WALL_SPRITE_SIZE + self.WALL_SPRITE_SIZE / 2
-                    wall.center_y = row * self.WALL_SPRITE_SIZE + self.WALL_SPRITE_SIZE / 2
-                    wall_list.append(wall)
-                elif value == 'se':
-                    wall = arcade.Sprite("assets/gfx/tile_0099.png", self.WALL_SPRITE_SCALING)
-                    wall.center_x = column * self.WALL_SPRITE_SIZE + self.WALL_SPRITE_SIZE / 2
-                    wall.center_y = row * self.WALL_SPRITE_SIZE + self.WALL_SPRITE_SIZE / 2
-                    wall_list.append(wall)
-                elif value == 'hr':
-                    wall = arcade.Sprite("assets/gfx/tile_0091.png", self.WALL_SPRITE_SCALING)
-                    wall.center_x = column * self.WALL_SPRITE_SIZE + self.WALL_SPRITE_SIZE / 2
-                    wall.center_y = row * self.WALL_SPRITE_SIZE + self.WALL_SPRITE_SIZE / 2
-                    wall_list.append(wall)
-                elif value == 'vr':
-                    wall = arcade.Sprite("assets/gfx/tile_0094.png", self.WALL_SPRITE_SCALING)
-                    wall.center_x = column * self.WALL_SPRITE_SIZE + self.WALL_SPRITE_SIZE / 2
-                    wall.center_y = row * self.WALL_SPRITE_SIZE + self.WALL_SPRITE_SIZE / 2
-                    wall_list.append(wall)
-        
+        # Image number of each cell, looked up for the whole grid at once.
+        sprites = tile_types.tiles["dark"]["sprite"][self.dungeon]
+        rows, columns = np.nonzero(sprites >= 0)
+        for row, column, sprite in zip(rows.tolist(), columns.tolist(), sprites[rows, columns].tolist()):
+            filename = tile_types.sprite_filename(sprite)
+            hit_box_cache.load_texture(filename)
+            wall = arcade.Sprite(filename, self.WALL_SPRITE_SCALING)
+            wall.center_x = column * self.WALL_SPRITE_SIZE + self.WALL_SPRITE_SIZE / 2
+            wall.center_y = row * self.WALL_SPRITE_SIZE + self.WALL_SPRITE_SIZE / 2
+            wall_list.append(wall)
+
         return wall_list
 
+    def build_tile_layer(self) -> TileLayer:
+        """ The generated map as a single static tile layer, for drawing """
+        return TileLayer(self.dungeon, self.WALL_SPRITE_SIZE)
+
     def place_player(self, player, wall_list, config):
         # Randomly place the player. If we are in a wall, repeat until we aren't.
         placed = False
         while not placed:
             
             # Get a position in line with the map grid
-            x = random.randrange(config.GRID_WIDTH) * config.WALL_SPRITE_SIZE
-            y = random.randrange(config.GRID_HEIGHT) * config.WALL_SPRITE_SIZE
+            x = self.spawn_rng.randrange(config.GRID_WIDTH) * config.TILE_SIZE
+            y = self.spawn_rng.randrange(config.GRID_HEIGHT) * config.TILE_SIZE
             
             # Randomly position
             player.center_x = x
@@ -314,9 +485,15 @@ Open world stuff
 """
 
 class World:
-    def __init__(self):
+    def __init__(self, seed: int = None):
         self.tree_count:int = 20
         self.tree_list:list = []
+        # Chance of a chunk getting a forest, see generate_chunk.
+        self.forest_chance:float = 0.3
+        # The same seed always grows the same world.
+        self.seed:int = random.getrandbits(64) if seed is None else seed
+        self.tree_rng = rng_stream(self.seed, "trees")
+        self.forest_rng = rng_stream(self.seed, "forests")
     
     @property
     def tree_list(self):
@@ -329,7 +506,10 @@ class World:
     def place_random_trees(self) -> list:
         for count in range(self.tree_count):
             self.tree_list.append(
-                Tree()
+                Tree(
+                    center_x=self.tree_rng.randrange(config.GRID_WIDTH),
+                    center_y=self.tree_rng.randrange(config.GRID_HEIGHT),
+                )
             )
         return self.tree_list
     
@@ -350,9 +530,36 @@ class World:
                 distance_to_center = arcade.get_distance(center[0], center[1], x, y)
                 # closer to the center will have higher probability of a tree being placed.
                 chance_of_tree = furthest_distance - distance_to_center
-                dice_roll = random.randint(0, int(chance_of_tree))
+                dice_roll = self.forest_rng.randint(0, int(chance_of_tree))
                 # Closer to 1 is less dense. Larger the number, denser the forest.
                 if dice_roll > chance_of_tree // forest_density:
                     # Create Tree object and place it in correct coords for world.
                     tree = Tree(center_x=start_coords[0] + x, center_y=start_coords[1] + y)
-                    self.tree_list.append(tree)
\ No newline at end of file
+                    self.tree_list.append(tree)
+
+    def generate_chunk(self, cx: int, cy: int, size: int) -> np.ndarray:
+        '''
+        Tile ids for one chunk of an endless open world (see game_map.GameMap).
+        Every chunk has its own random stream, so it comes out the same each
+        time it's generated.
+        '''
+        rng = np.random.default_rng([self.seed & 0xffffffffffffffff, cx & 0xffffffff, cy & 0xffffffff])
+        tiles = np.full((size, size), tile_types.FLOOR, dtype=np.uint8)
+
+        # Scattered trees, as dense as place_random_trees makes them.
+        tree_density = self.tree_count / (config.GRID_WIDTH * config.GRID_HEIGHT)
+        tiles[rng.random((size, size)) < tree_density] = tile_types.TREE
+
+        # Sometimes a forest, with the same fall off as generate_forest.
+        if rng.random() < self.forest_chance:
+            radius = int(rng.integers(2, max(3, size // 3)))
+            centre = rng.integers(0, size, 2)
+            forest_density = 1.3
+            furthest_distance = np.hypot(radius, radius)
+            rows, cols = np.mgrid[0:size, 0:size]
+            in_forest = (abs(rows - centre[0]) <= radius) & (abs(cols - centre[1]) <= radius)
+            chance_of_tree = furthest_distance - np.hypot(rows - centre[0], cols - centre[1])
+            dice_roll = rng.integers(0, np.maximum(chance_of_tree, 0).astype(int) + 1)
+            tiles[in_forest & (dice_roll > chance_of_tree // forest_density)] = tile_types.TREE
+
+        return tiles
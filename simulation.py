@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+"""
+The game's simulation (movement, physics, enemies, attacks and the camera)
+without a window or GL context. Game steps it from on_update; run this
+module to step it headless, as fast as the CPU allows, for soak tests, bots
+and benchmarks:
+
+python simulation.py --steps 100000 --enemies 200 --seed 1
+"""
+
+import argparse
+import os
+import random
+import time
+from typing import Optional
+
+import arcade
+import numpy as np
+
+from config import config
+from entities import Monster, Player
+from broadphase import UniformGrid, hit_box_extents, push_apart
+from entity_store import EntityStore
+from flowfield import FlowField
+from fov import FieldOfView
+from game_map import GameMap
+from healthbars import HealthBarLayer
+from map_cache import MapCache
+from navigation import NavGraph
+from performance import profiler
+from procgen import LevelData, RLDungeonGenerator, World
+from textures import textures
+from tile_physics import PhysicsEngineTiles, TilePhysics
+
+
+class Simulation:
+    """ Everything in the game world that changes from frame to frame """
+    def __init__(self):
+        self.level = None
+        self.seed = None
+        self.game_map = None
+        self.enemy_list = None
+        self.player_list = None
+        self.player_sprite = None
+        self.physics = None
+        self.physics_engine = None
+        self.health_bars = None
+        self.entities = None
+        self.grid = None
+        self.fov = None
+        self.flow_field = None
+        self._navigation = None
+        self.visibility = None
+        self.view_left = 0
+        self.view_bottom = 0
+
+    def setup(self, level: LevelData = None, enemy_count: int = 1):
+        """ Set up a dungeon level, or the open world if there's no level """
+        self.level = level
+        self.enemy_list = arcade.SpriteList(use_spatial_hash=False)
+        # Player frames live in their own atlas, so it's only filled once.
+        self.player_list = arcade.SpriteList(atlas=textures.animation("player").atlas)
+
+        self._navigation = None
+        if level is None:
+            world = World(config.SEED)
+            self.seed = world.seed
+            # The world is streamed in chunks around the camera. Each chunk gets
+            # scattered trees and sometimes a forest.
+            self.game_map = GameMap(world.generate_chunk)
+        else:
+            self.seed = level.seed
+            self.game_map = GameMap.from_grid(level.tiles)
+        self.game_map.update(self.view_left, self.view_bottom)
+
+        # Set up the player
+        self.player_sprite = Player()
+        self.player_list.append(self.player_sprite)
+        for _ in range(enemy_count):
+            self.enemy_list.append(Monster())
+
+        if level is not None and len(level.spawns) > 0:
+            # Start the player in the middle of a room, and the monsters in
+            # the other rooms (from the far end of the list).
+            spawns = level.spawns
+            self.place_on_tile(self.player_sprite, *spawns[0])
+            for i, enemy in enumerate(self.enemy_list):
+                self.place_on_tile(enemy, *spawns[-1 - i % len(spawns)])
+
+        # Everything moves against the map's tiles.
+        self.physics = TilePhysics(self.game_map)
+        self.physics_engine = PhysicsEngineTiles(self.player_sprite, self.physics)
+
+        # The monsters' state lives in one set of arrays, updated in one go.
+        self.entities = EntityStore(len(self.enemy_list))
+        self.entities.extend(self.enemy_list)
+        # Where the monsters are, for collisions and culling.
+        self.grid = UniformGrid()
+        self.grid.update_from_store(self.entities)
+        # The way to the player, for the monsters to chase them.
+        self.flow_field = FlowField(self.game_map)
+
+        # What the player can see, for fog of war and monster AI.
+        self.fov = FieldOfView(self.game_map)
+        self.visibility = self.fov.around(self.player_sprite.position)
+
+        # Everyone's health bars, kept up to date as they move or get hurt.
+        self.health_bars = HealthBarLayer(len(self.enemy_list) + 1)
+        self.health_bars.extend(self.enemy_list)
+        self.health_bars.add(self.player_sprite)
+
+    @property
+    def navigation(self) -> Optional[NavGraph]:
+        """
+        Rooms and doors, for long paths across a dungeon level (None in the
+        open world). Built the first time it's needed, not at every level
+        start.
+        """
+        if self._navigation is None and self.level is not None:
+            self._navigation = NavGraph.from_level(self.level)
+        return self._navigation
+
+    @staticmethod
+    def place_on_tile(sprite, row, col):
+        sprite.center_x = col * config.TILE_SIZE + config.TILE_SIZE / 2
+        sprite.center_y = row * config.TILE_SIZE + config.TILE_SIZE / 2
+
+    def step(self, delta_time) -> bool:
+        """ Move everything on by delta_time. Returns True if the view scrolled. """
+        # Move the player
+        with profiler.scope("physics"):
+            self.physics_engine.update()
+
+        # update player animations
+        with profiler.scope("animation"):
+            self.player_sprite.on_update(delta_time)
+            self.player_sprite.update_animation(delta_time)
+
+        # update enemy sprites
+        with profiler.scope("enemies"):
+            self.chase_player()
+            self.entities.update(delta_time, self.physics)
+
+        with profiler.scope("collision"):
+            self.grid.update_from_store(self.entities)
+            player_collision_list = self.grid.collisions(self.player_sprite)
+            if len(player_collision_list) > 0:
+                for enemy in player_collision_list:
+                    self.player_sprite.attack(enemy)
+
+        with profiler.scope("fov"):
+            self.visibility = self.fov.around(self.player_sprite.position)
+
+        with profiler.scope("scrolling"):
+            return self.scroll()
+
+    def chase_player(self):
+        """
+        Point every monster down the flow field towards the player, pushed
+        off each other and off the player so the horde surrounds them
+        instead of piling up on one spot.
+        """
+        self.flow_field.update(*self.player_sprite.position)
+        store = self.entities
+        dx, dy = self.flow_field.directions(store.x, store.y, self.player_sprite.position)
+        speed = config.MONSTER_SPEED
+
+        self.grid.update_from_store(store)
+        push = self.grid.separation(speed)
+        # The player doesn't give way, so monsters on them get all of the overlap.
+        left, bottom, right, top = hit_box_extents(self.player_sprite)
+        x, y = self.player_sprite.position
+        player_box = np.array([[x + left, y + bottom, x + right, y + top]])
+        on_player = self.grid.query_box(*player_box[0])
+        push[on_player] += push_apart(self.grid.boxes[on_player], player_box)
+        np.clip(push, -speed, speed, out=push)
+
+        store.vx[:] = dx * speed + push[:, 0]
+        store.vy[:] = dy * speed + push[:, 1]
+
+    def scroll(self) -> bool:
+        """ Keep the player inside the view's margins """
+        # Track if we need to change the viewport
+        changed = False
+
+        # Scroll left
+        left_bndry = self.view_left + config.VIEWPORT_MARGIN
+        if self.player_sprite.center_x < left_bndry:
+            self.view_left -= left_bndry - self.player_sprite.center_x
+            changed = True
+
+        # Scroll right
+        right_bndry = self.view_left + config.WINDOW_WIDTH - config.VIEWPORT_MARGIN
+        if self.player_sprite.center_x > right_bndry:
+            self.view_left += self.player_sprite.center_x - right_bndry
+            changed = True
+
+        # Scroll up
+        top_bndry = self.view_bottom + config.WINDOW_HEIGHT - config.VIEWPORT_MARGIN
+        if self.player_sprite.center_y > top_bndry:
+            self.view_bottom += self.player_sprite.center_y - top_bndry
+            changed = True
+
+        # Scroll down
+        bottom_bndry = self.view_bottom + config.VIEWPORT_MARGIN
+        if self.player_sprite.center_y < bottom_bndry:
+            self.view_bottom -= bottom_bndry - self.player_sprite.center_y
+            changed = True
+
+        if changed:
+            # Stream in the chunks around the new view.
+            self.game_map.update(self.view_left, self.view_bottom)
+        return changed
+
+
+def random_bot(sim: Simulation, rng: random.Random):
+    """ Mash the arrow keys (and sometimes attack), like a very bored player """
+    player = sim.player_sprite
+    player.up_pressed, player.down_pressed, player.left_pressed, player.right_pressed = (
+        rng.random() < 0.5 for _ in range(4))
+    if rng.random() < 0.1:
+        player.attack_pressed = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the game simulation without a window.")
+    parser.add_argument("--steps", type=int, default=10000, help="number of updates to run")
+    parser.add_argument("--dt", type=float, default=1 / 60, help="simulated seconds per update")
+    parser.add_argument("--enemies", type=int, default=1, help="number of monsters")
+    parser.add_argument("--seed", type=int, default=config.SEED, help="level and bot seed")
+    parser.add_argument("--open-world", action="store_true", help="use the open world instead of a dungeon")
+    parser.add_argument("--bot-every", type=int, default=30, help="updates between bot key changes")
+    args = parser.parse_args()
+
+    # Assets are loaded relative to this file, same as in the game.
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    seed = random.getrandbits(64) if args.seed is None else args.seed
+    config.SEED = seed
+
+    level = None
+    if not args.open_world:
+        # Cache only levels asked for by seed; a random one won't come up again.
+        if config.USE_MAP_CACHE and args.seed is not None:
+            level = MapCache().get_or_generate(seed)
+        else:
+            dg = RLDungeonGenerator(config, seed)
+            dg.generate_map()
+            level = dg.level_data()
+
+    sim = Simulation()
+    sim.setup(level, enemy_count=args.enemies)
+    bot_rng = random.Random(seed)
+
+    start = time.perf_counter()
+    for step in range(args.steps):
+        if step % args.bot_every == 0:
+            random_bot(sim, bot_rng)
+        sim.step(args.dt)
+    elapsed = time.perf_counter() - start
+
+    simulated = args.steps * args.dt
+    print(f"{args.steps} steps in {elapsed:.2f}s | {args.steps / elapsed:.0f} steps/s "
+          f"| {simulated / elapsed:.1f}x real time | seed {seed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import atexit
+import collections
+import csv
+import json
+import os
+import socket
+import threading
+import time
+
+from config import config
+
+'''
+Per-frame metrics sent out of the game for graphing later, by a background
+thread so the game never waits on a disk or a socket.
+
+Targets (config.TELEMETRY_TARGET):
+  telemetry/frames.jsonl     one JSON object per line, appended
+  telemetry/frames.csv       CSV, with a header; a new file if the columns change
+  udp://127.0.0.1:9999       one JSON line per datagram
+  unix:///tmp/arl.sock       the same, to a Unix datagram socket
+'''
+
+
+def flatten(record: dict, prefix: str = "") -> dict:
+    """ {"phases": {"update": 1}} -> {"phases.update": 1}, for CSV columns """
+    flat = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+class TelemetrySink:
+    """
+    Queues records from the game thread and writes them in batches from a
+    writer thread. record() only appends to a bounded deque: if the writer
+    falls behind, the oldest records are dropped (and counted) rather than
+    holding up a frame.
+
+    Each counter is only ever changed by one thread, so neither needs a
+    lock: `dropped` by the game thread, `unsent` by the writer thread.
+    """
+    def __init__(self, target: str, batch_size: int = 60, flush_interval: float = 1.0,
+                 max_queued: int = 10000):
+        self.target = target
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = collections.deque(maxlen=max_queued)
+        self.dropped = 0
+        # Records the writer couldn't get out (e.g. nobody on the socket).
+        self.unsent = 0
+        self.session = int(time.time())
+        self.wake = threading.Event()
+        self.stopping = False
+        self.thread = None
+
+    def record(self, record: dict):
+        if self.thread is None:
+            self.start()
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(record)
+        if len(self.queue) >= self.batch_size:
+            self.wake.set()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="telemetry", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def close(self):
+        """ Write out whatever's queued and stop the writer """
+        if self.thread is None or self.stopping:
+            return
+        self.stopping = True
+        self.wake.set()
+        self.thread.join(timeout=5)
+
+    def drain(self) -> list:
+        batch = []
+        while self.queue:
+            batch.append(self.queue.popleft())
+        return batch
+
+    def run(self):
+        writer = self.open_writer()
+        try:
+            while not self.stopping:
+                self.wake.wait(self.flush_interval)
+                self.wake.clear()
+                batch = self.drain()
+                if batch:
+                    writer.write(batch)
+            writer.write(self.drain())
+        finally:
+            writer.close()
+
+    def open_writer(self):
+        if self.target.startswith("udp://"):
+            host, port = self.target[len("udp://"):].rsplit(":", 1)
+            return SocketWriter(socket.AF_INET, (host, int(port)), self)
+        if self.target.startswith("unix://"):
+            return SocketWriter(socket.AF_UNIX, self.target[len("unix://"):], self)
+        if self.target.endswith(".csv"):
+            return CSVWriter(self.target, self)
+        return JSONLinesWriter(self.target, self)
+
+
+class JSONLinesWriter:
+    def __init__(self, path: str, sink: TelemetrySink, newline: str = None):
+        self.sink = sink
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.file = open(path, "a", newline=newline)
+
+    def write(self, batch: list):
+        for record in batch:
+            self.file.write(json.dumps({"session": self.sink.session, **record}) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class CSVWriter(JSONLinesWriter):
+    """
+    Columns are every key in the first batch written, so scopes that only
+    some frames enter (update vs. draw) all get one. Should a later batch
+    bring new keys, or an existing file's header not cover them, the rows
+    go on in a new file (frames.<session>.csv, then frames.<session>.2.csv,
+    ...) under a header with the new columns added, rather than losing them.
+    """
+    def __init__(self, path: str, sink: TelemetrySink):
+        self.path = path
+        self.files = 1
+        self.columns = None
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, newline="") as existing:
+                self.columns = next(csv.reader(existing), None)
+        # The csv module writes its own line endings.
+        super().__init__(path, sink, newline="")
+        self.writer = None if self.columns is None else csv.DictWriter(self.file, fieldnames=self.columns)
+
+    def write(self, batch: list):
+        rows = [flatten({"session": self.sink.session, **record}) for record in batch]
+        keys = list(dict.fromkeys(key for row in rows for key in row))
+        if self.columns is None:
+            self.start_file(keys, new_path=False)
+        elif not set(keys) <= set(self.columns):
+            self.start_file(self.columns + [key for key in keys if key not in self.columns], new_path=True)
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def start_file(self, columns: list, new_path: bool):
+        """ Write a header, in a new file next to the first one if asked """
+        if new_path:
+            self.file.close()
+            base, extension = os.path.splitext(self.path)
+            suffix = f".{self.files}" if self.files > 1 else ""
+            self.file = open(f"{base}.{self.sink.session}{suffix}{extension}", "w", newline="")
+            self.files += 1
+        self.columns = columns
+        self.writer = csv.DictWriter(self.file, fieldnames=columns)
+        self.writer.writeheader()
+
+
+class SocketWriter:
+    def __init__(self, family: int, address, sink: TelemetrySink):
+        self.sink = sink
+        self.address = address
+        self.socket = socket.socket(family, socket.SOCK_DGRAM)
+
+    def write(self, batch: list):
+        for record in batch:
+            try:
+                self.socket.sendto(json.dumps({"session": self.sink.session, **record}).encode(), self.address)
+            except OSError:
+                # Nobody listening (or the socket's gone); the game carries on.
+                self.sink.unsent += 1
+
+    def close(self):
+        self.socket.close()
+
+
+# One sink for the whole session, or None when telemetry is off.
+telemetry = TelemetrySink(config.TELEMETRY_TARGET) if config.TELEMETRY_TARGET else None
@@ -0,0 +1,83 @@
+import math
+from typing import Dict, List, Optional, Sequence
+
+import arcade
+
+from hitbox_cache import hit_box_cache
+
+
+class AnimationSet:
+    """
+    Every frame of an animated sprite sheet, e.g. the player's
+    idle/walk/attack x down/up/right/left x 4 frames.
+
+    Frames are loaded once and shared by every sprite that uses the set.
+    A frame handle is just an index into `textures`, see handle(). Sprite
+    lists made with `atlas` get all the frames in one texture atlas, which
+    is filled once and then reused by every sprite list (and level) after.
+    """
+    def __init__(self, name: str, path: str, actions: Sequence[str], directions: Sequence[str], frame_count: int):
+        self.name = name
+        self.actions = list(actions)
+        self.directions = list(directions)
+        self.frame_count = frame_count
+        self.textures: List[arcade.Texture] = [
+            hit_box_cache.load_texture(path.format(action=action, direction=direction, frame=frame))
+            for action in self.actions
+            for direction in self.directions
+            for frame in range(frame_count)
+        ]
+        self._atlas = None
+
+    def handle(self, action: int, direction: int, frame: int) -> int:
+        return (action * len(self.directions) + direction) * self.frame_count + frame
+
+    def frame(self, action: int, direction: int, frame: int) -> arcade.Texture:
+        return self.textures[self.handle(action, direction, frame)]
+
+    @property
+    def atlas(self) -> Optional[arcade.TextureAtlas]:
+        """ An atlas holding every frame, or None until there's a window to make one """
+        if self._atlas is None:
+            try:
+                arcade.get_window()
+            except RuntimeError:
+                return None
+            # Square-ish grid of the biggest frame, plus the atlas' borders.
+            width = max(texture.width for texture in self.textures) + 2
+            height = max(texture.height for texture in self.textures) + 2
+            columns = math.ceil(math.sqrt(len(self.textures)))
+            rows = math.ceil(len(self.textures) / columns)
+            size = 2 ** math.ceil(math.log2(max(columns * width, rows * height)))
+            self._atlas = arcade.TextureAtlas((size, size), textures=self.textures)
+        return self._atlas
+
+
+class TextureRegistry:
+    """
+    Process-wide animation sets, loaded the first time they're asked for.
+    Making another sprite that uses a set (or resetting the level) doesn't
+    touch the disk or decode any images.
+    """
+    def __init__(self):
+        self.definitions: Dict[str, tuple] = {}
+        self.sets: Dict[str, AnimationSet] = {}
+
+    def define(self, name: str, path: str, actions: Sequence[str], directions: Sequence[str], frame_count: int):
+        """ path is formatted with action, direction and frame """
+        self.definitions[name] = (path, actions, directions, frame_count)
+
+    def animation(self, name: str) -> AnimationSet:
+        animation = self.sets.get(name)
+        if animation is None:
+            animation = self.sets[name] = AnimationSet(name, *self.definitions[name])
+        return animation
+
+
+textures = TextureRegistry()
+textures.define(
+    "player", "assets/gfx/player/{action}_{direction}_{frame}.png",
+    actions=["idle", "walk", "attack"],
+    directions=["down", "up", "right", "left"],
+    frame_count=4,
+)
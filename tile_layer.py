@@ -0,0 +1,141 @@
+from typing import Tuple
+
+import arcade
+from arcade.gl import BufferDescription
+import numpy as np
+
+import tile_types
+
+# Each tile is one instance of a unit quad. The instance only carries the
+# tile's position and id; the id picks the tile's rectangle in the atlas
+# from the `regions` table.
+VERTEX_SHADER = """
+#version 330
+
+uniform Projection {
+    uniform mat4 matrix;
+} proj;
+
+// Atlas rectangle (x, y, width, height) of each tile id.
+uniform vec4 regions[REGION_COUNT];
+uniform float tile_size;
+
+in vec2 in_corner;
+in vec2 in_position;
+in float in_tile;
+
+out vec2 v_uv;
+
+void main() {
+    vec4 region = regions[int(in_tile)];
+    gl_Position = proj.matrix * vec4(in_position + in_corner * tile_size, 0.0, 1.0);
+    // The atlas is stored upside down, same as for arcade's sprite shaders.
+    v_uv = vec2(region.x + in_corner.x * region.z, 1.0 - (region.y + in_corner.y * region.w));
+}
+"""
+
+FRAGMENT_SHADER = """
+#version 330
+
+uniform sampler2D atlas;
+
+in vec2 v_uv;
+
+out vec4 f_color;
+
+void main() {
+    vec4 color = texture(atlas, v_uv);
+    if (color.a == 0.0) {
+        discard;
+    }
+    f_color = color;
+}
+"""
+
+
+class TileAtlas:
+    """
+    Every tile image packed into one texture, plus the GL program and the
+    region table used to draw tile layers. Shared by all layers.
+    """
+    def __init__(self, ctx):
+        self.ctx = ctx
+        sprites = tile_types.tiles["dark"]["sprite"]
+        textures = {
+            sprite: arcade.load_texture(tile_types.sprite_filename(sprite))
+            for sprite in set(sprites.tolist()) if sprite >= 0
+        }
+        self.atlas = arcade.TextureAtlas.create_from_texture_sequence(textures.values())
+
+        # Tile ids without an image keep an empty region, but they are never
+        # drawn anyway.
+        self.regions = np.zeros((len(sprites), 4), dtype=np.float32)
+        for tile_id, sprite in enumerate(sprites.tolist()):
+            if sprite >= 0:
+                region = self.atlas.get_region_info(textures[sprite].name)
+                self.regions[tile_id] = region.texture_coordinates
+
+        self.program = ctx.program(
+            vertex_shader=VERTEX_SHADER.replace("REGION_COUNT", str(len(sprites))),
+            fragment_shader=FRAGMENT_SHADER,
+        )
+        self.program["regions"] = self.regions.flatten().tolist()
+        self.program["atlas"] = 0
+        # Unit quad, as a triangle strip.
+        self.corners = ctx.buffer(data=np.array([0, 0, 1, 0, 0, 1, 1, 1], dtype=np.float32).tobytes())
+
+
+_tile_atlas = None
+
+
+def get_tile_atlas() -> TileAtlas:
+    """ The process-wide tile atlas, created on first use (needs a window) """
+    global _tile_atlas
+    if _tile_atlas is None:
+        _tile_atlas = TileAtlas(arcade.get_window().ctx)
+    return _tile_atlas
+
+
+class TileLayer:
+    """
+    A static grid of tile ids drawn with one instanced draw call.
+
+    The instance data (position and id of every tile with an image) is built
+    from the grid in a single vectorised pass. It is uploaded to the GPU the
+    first time the layer is drawn, so layers can be built without a window.
+    """
+    def __init__(self, grid: np.ndarray, tile_size: float, origin: Tuple[float, float] = (0, 0)):
+        self.tile_size = tile_size
+        sprites = tile_types.tiles["dark"]["sprite"][grid]
+        rows, columns = np.nonzero(sprites >= 0)
+
+        self.instances = np.empty((len(rows), 3), dtype=np.float32)
+        self.instances[:, 0] = columns * tile_size + origin[0]
+        self.instances[:, 1] = rows * tile_size + origin[1]
+        self.instances[:, 2] = grid[rows, columns]
+
+        self.geometry = None
+
+    def __len__(self):
+        return len(self.instances)
+
+    def draw(self):
+        if len(self.instances) == 0:
+            return
+        tile_atlas = get_tile_atlas()
+        ctx = tile_atlas.ctx
+        if self.geometry is None:
+            buffer = ctx.buffer(data=self.instances.tobytes())
+            self.geometry = ctx.geometry(
+                [
+                    BufferDescription(tile_atlas.corners, "2f", ["in_corner"]),
+                    BufferDescription(buffer, "2f 1f", ["in_position", "in_tile"], instanced=True),
+                ],
+                mode=ctx.TRIANGLE_STRIP,
+            )
+
+        tile_atlas.program["tile_size"] = self.tile_size
+        # Keep the pixel art sharp.
+        tile_atlas.atlas.texture.filter = ctx.NEAREST, ctx.NEAREST
+        tile_atlas.atlas.texture.use(0)
+        self.geometry.render(tile_atlas.program, vertices=4, instances=len(self.instances))
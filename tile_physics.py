@@ -0,0 +1,115 @@
+import math
+
+import numpy as np
+
+from broadphase import hit_box_extents
+
+# Slack, in tiles, so a box resting exactly on a tile edge (give or take
+# rounding) isn't counted as overlapping the tile on the other side.
+EPSILON = 1e-6
+
+
+class TilePhysics:
+    """
+    Moves axis-aligned boxes through a GameMap, stopping them against tiles
+    that can't be walked over.
+
+    Each axis is swept separately (up/down, then left/right, as arcade's
+    simple engine does), at most a tile at a time so nothing tunnels
+    through a wall. Only the line of tiles a box's leading edge moves into
+    is looked up, straight from the map's tile ids, so a move costs the
+    same however many walls there are. Every box is moved at once, so the
+    player and all the monsters go through the same vectorised code.
+    """
+    def __init__(self, game_map):
+        self.game_map = game_map
+        self.tile_size = game_map.tile_size
+
+    def sweep(self, boxes: np.ndarray, delta: np.ndarray, axis: int):
+        """
+        Move (left, bottom, right, top) boxes by delta along one axis (0 for
+        x, 1 for y). Returns how far each got and which were stopped.
+        """
+        size = self.tile_size
+        moved = np.zeros(len(boxes))
+        stopped = np.zeros(len(boxes), dtype=bool)
+        moving = np.flatnonzero(delta != 0)
+        if len(moving) == 0:
+            return moved, stopped
+
+        low, high = boxes[moving, axis], boxes[moving, axis + 2]
+        # The tiles each box covers across the way it's moving.
+        first = np.floor(boxes[moving, 1 - axis] / size + EPSILON).astype(np.int64)
+        last = np.maximum(np.ceil(boxes[moving, 3 - axis] / size - EPSILON).astype(np.int64) - 1, first)
+        across = np.minimum(first[:, None] + np.arange((last - first).max() + 1), last[:, None])
+
+        steps = max(1, math.ceil(np.abs(delta[moving]).max() / size))
+        step = delta[moving] / steps
+        forward = step > 0
+        travelled = np.zeros(len(moving))
+        free = np.ones(len(moving), dtype=bool)
+        for _ in range(steps):
+            # Which line of tiles the leading edge is in now, and after the step.
+            edge = np.where(forward, high, low) + travelled
+            now = np.where(forward, np.ceil(edge / size - EPSILON) - 1, np.floor(edge / size + EPSILON))
+            after = np.where(forward, np.ceil((edge + step) / size - EPSILON) - 1,
+                             np.floor((edge + step) / size + EPSILON))
+            entering = np.flatnonzero(free & (after != now))
+            if len(entering):
+                line = np.broadcast_to(after[entering, None].astype(np.int64), across[entering].shape)
+                if axis == 0:
+                    walkable = self.game_map.walkable_at(across[entering], line)
+                else:
+                    walkable = self.game_map.walkable_at(line, across[entering])
+                hit = entering[~walkable.all(axis=1)]
+                # Up against the near side of the tile it hit.
+                wall = np.where(forward[hit], after[hit], after[hit] + 1) * size
+                travelled[hit] += wall - edge[hit]
+                free[hit] = False
+            travelled[free] += step[free]
+        # Whatever wasn't stopped went the whole way, without rounding.
+        travelled[free] = delta[moving][free]
+
+        moved[moving] = travelled
+        stopped[moving] = ~free
+        return moved, stopped
+
+    def move(self, boxes, dx, dy):
+        """
+        Move boxes by (dx, dy). Returns how far each moved in x and y, and
+        whether it was stopped in x and in y.
+        """
+        boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+        moved_y, stopped_y = self.sweep(boxes, np.asarray(dy, dtype=np.float64), 1)
+        boxes[:, 1] += moved_y
+        boxes[:, 3] += moved_y
+        moved_x, stopped_x = self.sweep(boxes, np.asarray(dx, dtype=np.float64), 0)
+        return moved_x, moved_y, stopped_x, stopped_y
+
+
+class PhysicsEngineTiles:
+    """
+    Stand-in for arcade.PhysicsEngineSimple that moves one sprite by its
+    change_x/change_y with TilePhysics, instead of testing its polygon
+    against every wall sprite.
+    """
+    def __init__(self, player_sprite, physics: TilePhysics):
+        self.player_sprite = player_sprite
+        self.physics = physics
+
+    def update(self) -> bool:
+        """ Move the sprite. Returns True if a wall stopped it. """
+        sprite = self.player_sprite
+        if sprite.change_x == 0 and sprite.change_y == 0:
+            return False
+        left, bottom, right, top = hit_box_extents(sprite)
+        x, y = sprite.position
+        moved_x, moved_y, stopped_x, stopped_y = self.physics.move(
+            (x + left, y + bottom, x + right, y + top), [sprite.change_x], [sprite.change_y])
+        sprite.position = (x + float(moved_x[0]), y + float(moved_y[0]))
+        # Stop dead against the wall, like arcade's engine.
+        if stopped_x[0]:
+            sprite.change_x = 0
+        if stopped_y[0]:
+            sprite.change_y = 0
+        return bool(stopped_x[0] or stopped_y[0])
@@ -2,23 +2,21 @@ from typing import Tuple
 
 import numpy as np  # type: ignore
 
-from entities import Wall
-
 # Tile graphics structured type compatible with Console.tiles_rgb.
 graphic_dt = np.dtype(
     [
         ("ch", np.int32),       # Unicode codepoint.
         ("fg", "3B"),           # 3 unsigned bytes, for RGB colors.
         ("bg", "3B"),
-        ("sprite", Wall),     # 
+        ("sprite", np.int16),   # Number of the assets/gfx/tile_XXXX.png image, -1 for none.
     ]
 )
 
 # Tile struct used for statically defined tile data.
 tile_dt = np.dtype(
     [
-        ("walkable", np.bool),  # True if this tile can be walked over.
-        ("transparent", np.bool),  # True if this tile doesn't block FOV.
+        ("walkable", np.bool_),  # True if this tile can be walked over.
+        ("transparent", np.bool_),  # True if this tile doesn't block FOV.
         ("dark", graphic_dt),  # Graphics for when this tile is not in FOV.
     ]
 )
@@ -28,15 +26,66 @@ def new_tile(
     *,  # Enforce the use of keywords, so that parameter order doesn't matter.
     walkable: int,
     transparent: int,
-    dark: Tuple[int, Tuple[int, int, int], Tuple[int, int, int]],
+    dark: Tuple[int, Tuple[int, int, int], Tuple[int, int, int], int],
 ) -> np.ndarray:
     """Helper function for defining individual tile types """
     return np.array((walkable, transparent, dark), dtype=tile_dt)
 
 
 floor = new_tile(
-    walkable=True, transparent=True, dark=(ord(" "), (255, 255, 255), (50, 50, 150), Wall()),
+    walkable=True, transparent=True, dark=(ord("."), (255, 255, 255), (50, 50, 150), -1),
+)
+door = new_tile(
+    walkable=True, transparent=True, dark=(ord("+"), (255, 255, 255), (50, 50, 150), -1),
 )
 wall = new_tile(
-    walkable=False, transparent=False, dark=(ord(" "), (255, 255, 255), (0, 0, 100), Wall()),
-)
\ No newline at end of file
+    walkable=False, transparent=False, dark=(ord("#"), (255, 255, 255), (0, 0, 100), 11),
+)
+
+
+def room_wall(sprite: int) -> np.ndarray:
+    """ Room walls only differ by the image used to draw them """
+    return new_tile(
+        walkable=False, transparent=False, dark=(ord("#"), (255, 255, 255), (0, 0, 100), sprite),
+    )
+
+
+tree = new_tile(
+    walkable=False, transparent=False, dark=(ord("T"), (0, 255, 0), (50, 50, 150), 55),
+)
+
+# Tile ids stored in the (uint8) dungeon grid. Each id is an index into `tiles`.
+ROCK = 0
+FLOOR = 1
+DOOR = 2
+WALL_NW = 3
+WALL_NE = 4
+WALL_SW = 5
+WALL_SE = 6
+WALL_HR = 7
+WALL_VR = 8
+TREE = 9
+
+tiles = np.array(
+    [
+        wall,               # ROCK
+        floor,              # FLOOR
+        door,               # DOOR
+        room_wall(90),      # WALL_NW
+        room_wall(93),      # WALL_NE
+        room_wall(96),      # WALL_SW
+        room_wall(99),      # WALL_SE
+        room_wall(91),      # WALL_HR
+        room_wall(94),      # WALL_VR
+        tree,               # TREE
+    ],
+    dtype=tile_dt,
+)
+
+# Short names for each tile id, only used for printing a map while debugging.
+tile_names = np.array(["#", ".", "+", "nw", "ne", "sw", "se", "hr", "vr", "T"])
+
+
+def sprite_filename(sprite: int) -> str:
+    """ Path of the image for a tile's `sprite` number """
+    return f"assets/gfx/tile_{sprite:04d}.png"
@@ -1,12 +1,16 @@
 import arcade
 from game import Game
 from config import config
+from level_prep import level_preparer
 
 
 class MenuView(arcade.View):
     def on_show(self):
         self.background = arcade.load_texture("assets/gfx/menu_background.png")
         arcade.set_background_color(arcade.color.BLACK)
+        if not config.OPEN_WORLD:
+            # Get the first level ready while the menu is up.
+            level_preparer.prepare()
 
     def on_draw(self):
         arcade.start_render()
@@ -43,6 +47,7 @@ class MenuView(arcade.View):
             game.setup()
         elif key == arcade.key.ESCAPE:
             # Quit the game
+            level_preparer.shutdown()
             self.window.close()
 
     def on_mouse_press(self, _x, _y, _button, _modifiers):
@@ -153,6 +158,7 @@ class QuitView(arcade.View):
             self.window.show_view(self.game_view)
         elif key == arcade.key.Y:
             # Quit the game
+            level_preparer.shutdown()
             self.window.close()
 
 
@@ -205,6 +211,7 @@ class GameOverView(arcade.View):
     def on_key_press(self, key, _modifiers):
         if key == arcade.key.ESCAPE:   
             # Quit the game
+            level_preparer.shutdown()
             self.window.close()
         elif key == arcade.key.SPACE:  # reset game
             # stop the previous game view's music